@@ -1,4 +1,5 @@
 import os
+import mmap
 import sys
 from lib.parse_3db import parse_3db_file
 
@@ -13,8 +14,8 @@ def main():
         return
     
     print(f'Loading model from {model_path}')
-    with open(model_path, 'rb') as f:
-        file_data = f.read()
+    # Map the file instead of reading it into memory
+    with open(model_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_data:
         model = parse_3db_file(file_data)
         
         model_name = model.name
@@ -6,10 +6,13 @@ import re
 import traceback
 import shutil
 import datetime
+from functools import lru_cache
 
 # Create a log file for debugging
+# Buffered so that verbose runs don't issue one write() per log line;
+# main() flushes at each phase boundary instead
 log_file_path = 'blender_log.txt'
-log_file = open(log_file_path, 'w')
+log_file = open(log_file_path, 'w', buffering=65536)
 
 def log(message, level="INFO"):
     """Log a message with timestamp and level."""
@@ -17,12 +20,22 @@ def log(message, level="INFO"):
     log_message = f"[{timestamp}] [{level}] {message}"
     print(log_message)
     log_file.write(log_message + "\n")
-    log_file.flush()  # Ensure the message is written immediately
 
 def error(message):
     """Log an error message."""
     log(message, "ERROR")
 
+# Object/material names repeat for every frame, so format each one only once
+@lru_cache(maxsize=256)
+def _link_name(link_num):
+    """Return the base object name for a link index."""
+    return f"link_{link_num:02d}"
+
+@lru_cache(maxsize=256)
+def _misc_material_name(index):
+    """Return the name of an unmapped material."""
+    return f"misc_material_{index}"
+
 log("DEBUG: Fixed Blender script is starting!")
 log(f"DEBUG: Python version: {sys.version}")
 log(f"DEBUG: Arguments: {sys.argv}")
@@ -639,7 +652,7 @@ def process_gltf_structure(gltf_path, model_name=None):
             if obj.material_slots and obj.material_slots[0].material:
                 material_name = obj.material_slots[0].material.name
             else:
-                material_name = f"misc_material_{i}"
+                material_name = _misc_material_name(i)
             
             # Find appropriate texture
             texture_path = None
@@ -784,7 +797,7 @@ def process_gltf_structure(gltf_path, model_name=None):
                     base_link_name = f"{material_name}"
                 else:
                     # Fallback to using link number if no material name available
-                    base_link_name = f"link_{link_num:02d}"
+                    base_link_name = _link_name(link_num)
                 
                 # Check for existing objects with the same base name in this frame
                 existing_links = [child for child in frame_obj.children 
@@ -878,6 +891,9 @@ def main():
             error("Failed to process GLTF structure")
             sys.exit(1)
         
+        # Hierarchy section is done - write it out before the (long) export
+        log_file.flush()
+        
         # Make sure we select all objects for export
         bpy.ops.object.select_all(action='SELECT')
         
@@ -896,6 +912,7 @@ def main():
             # Set the filepath to point to the .fbm directory
             img.filepath = os.path.join(model_basename + ".fbm", img_name)
             log(f"Updated texture path: {img.filepath}")
+        log_file.flush()
         
         # Export to FBX with ABSOLUTE path mode to preserve our custom paths
         export_result = bpy.ops.export_scene.fbx(
@@ -913,6 +930,8 @@ def main():
             axis_up='Y'
         )
         
+        log_file.flush()
+        
         if 'FINISHED' in export_result:
             log(f"FBX export successful!")
             if os.path.exists(output_fbx):
@@ -1,3 +1,4 @@
+import mmap
 import sys
 from lib.parse_3db import parse_3db_file
 
@@ -8,8 +9,9 @@ def main():
     
     model_path = sys.argv[1]
     
-    with open(model_path, 'rb') as f:
-        model = parse_3db_file(f.read())
+    # Map the file instead of reading it into memory
+    with open(model_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_data:
+        model = parse_3db_file(file_data)
     
     print(f"Model: {model.name}")
     print(f"Materials: {len(model.materials)}")
@@ -18,8 +18,19 @@ import json
 import subprocess
 import importlib.util
 import shutil
+import platform
+import glob
+import re
+import threading
+import time
 from typing import Dict, List, Optional
 
+# Sidecar file remembering where Blender was found on this machine
+BLENDER_CACHE_PATH = os.path.join("exports", ".blender_path.json")
+
+# Seconds Blender may spend on one FBX file before it is considered stuck
+BLENDER_FILE_TIMEOUT = 300
+
 def print_header(title, char="="):
     """Print a header with decoration."""
     width = 80
@@ -27,21 +38,23 @@ def print_header(title, char="="):
     print(f"{title:^{width}}")
     print(f"{char * width}\n")
 
-def create_blender_fixer_script():
-    """Create a temporary Blender script that consolidates materials."""
-    script_path = os.path.join("exports", "fix_materials_script.py")
-    
-    # Using single quotes for outer multi-line string to avoid syntax issues
-    script_content = '''
+# Blender-side fixer. It is handed to Blender with --python-expr, so nothing has
+# to be written to disk for a normal run.
+# Using single quotes for outer multi-line string to avoid syntax issues
+FIXER_SCRIPT = '''
 import bpy
 import os
 import json
 import sys
+import numpy as np
+from collections import defaultdict
+from functools import lru_cache
 
 def log(message):
     # Log a message to the console
     print(f"[FIXER] {message}")
 
+@lru_cache(maxsize=4096)
 def get_base_name(name):
     # Extracts base name by removing Blender's numeric suffix.
     # For example: "mesh.001" -> "mesh"
@@ -51,17 +64,36 @@ def get_base_name(name):
             return '.'.join(parts[:-1])
     return name
 
-def clean_hierarchy():
+def material_key(mat):
+    # Describes what a material looks like, ignoring its name, so that copies
+    # of the same material end up with the same key
+    if not mat.use_nodes or not mat.node_tree:
+        return ('flat', tuple(mat.diffuse_color))
+    
+    nodes = mat.node_tree.nodes
+    images = tuple(sorted(n.image.filepath for n in nodes if n.type == 'TEX_IMAGE' and n.image))
+    bsdf = next((n for n in nodes if n.type == 'BSDF_PRINCIPLED'), None)
+    params = ()
+    if bsdf:
+        # Colors are bpy arrays, turned into tuples so they can be hashed and
+        # compared. Without Base Color and Alpha every untextured material
+        # would share one key and get merged into the first of them
+        params = tuple(
+            tuple(value) if hasattr(value, '__len__') else value
+            for value in (bsdf.inputs[k].default_value
+                          for k in ('Base Color', 'Alpha', 'Metallic', 'Roughness') if k in bsdf.inputs)
+        )
+    return ('nodes', images, params, mat.blend_method)
+
+def clean_hierarchy(model_roots, meshes):
     # Clean up the scene hierarchy by removing any extra objects
     # and ensuring the proper structure: model_name/animation_name/frame_xx/...
     log("Cleaning hierarchy structure...")
     
-    # First identify the root object of our model
-    model_roots = []
-    for obj in bpy.context.scene.objects:
-        if obj.type == 'EMPTY' and not obj.parent:
-            # This is potentially a root object
-            model_roots.append(obj)
+    # model_roots holds the parentless empties - one of them is our model
+    if not model_roots:
+        log("No root objects found, nothing to clean")
+        return 0
     
     # If we have exactly one root, it's likely the model name
     if len(model_roots) == 1:
@@ -71,19 +103,11 @@ def clean_hierarchy():
         # We might have a duplicate hierarchy or extra objects
         log(f"Found {len(model_roots)} root objects, looking for the model root...")
         
-        # Try to find the true model root by looking for animation children
-        true_root = None
-        for root in model_roots:
-            has_animations = False
-            for child in root.children:
-                # Check if child has "frame_" children, which would indicate it's an animation
-                for grandchild in child.children:
-                    if grandchild.name.startswith("frame_"):
-                        has_animations = True
-                        break
-                if has_animations:
-                    true_root = root
-                    break
+        # Try to find the true model root by looking for animation children:
+        # the grandparent of any "frame_" object is a root holding animations
+        anim_roots = {obj.parent.parent for obj in bpy.data.objects
+                      if obj.name.startswith("frame_") and obj.parent and obj.parent.parent}
+        true_root = next((root for root in model_roots if root in anim_roots), None)
         
         if true_root:
             log(f"Found true model root: {true_root.name}")
@@ -96,37 +120,79 @@ def clean_hierarchy():
     # Fix any duplicate hierarchy issues
     fixed = 0
     
+    # Objects are removed together at the end so the scene is only rebuilt once
+    to_remove = []
+    
     # Check for a structure like model_name/model_name/animation_name/...
     if root.children and len(root.children) == 1 and root.children[0].name == root.name:
         duplicate_root = root.children[0]
         log(f"Found duplicate root: {duplicate_root.name}")
         
         # Move all children of the duplicate root to the real root
-        for child in list(duplicate_root.children):
+        # (children is already a fresh tuple, so reparenting while iterating is safe)
+        for child in duplicate_root.children:
             log(f"Moving {child.name} to the true root")
             child.parent = root
             fixed += 1
         
         # Delete the empty duplicate root
-        bpy.data.objects.remove(duplicate_root)
-        log("Removed duplicate root object")
+        to_remove.append(duplicate_root)
+        log("Removing duplicate root object")
         fixed += 1
     
     # Remove any standalone cubes in the root of the scene
-    for obj in bpy.context.scene.objects:
-        if obj.type == 'MESH' and obj.name.lower() == 'cube' and not obj.parent:
+    for obj in meshes:
+        if obj.name.lower() == 'cube' and not obj.parent:
             log(f"Removing standalone cube: {obj.name}")
-            bpy.data.objects.remove(obj)
+            to_remove.append(obj)
             fixed += 1
     
+    if to_remove:
+        bpy.data.batch_remove(ids=to_remove)
+    
     log(f"Fixed {fixed} hierarchy issues")
     return fixed
 
-def consolidate_materials():
-    # Helps reduce the number of duplicate materials by consolidating ones with the same base name
+def compact_mesh_materials(mesh):
+    # After consolidation a mesh can hold the same material in several slots.
+    # Merge those slots and renumber the polygons in one bulk read/write.
+    materials = list(mesh.materials)
+    if len(materials) < 2:
+        return 0
+    
+    # Map every old slot index to the first slot holding the same material
+    first_slot = {}
+    kept = []
+    lut = np.empty(len(materials), dtype=np.int32)
+    for i, mat in enumerate(materials):
+        if mat not in first_slot:
+            first_slot[mat] = len(kept)
+            kept.append(mat)
+        lut[i] = first_slot[mat]
+    
+    removed = len(materials) - len(kept)
+    if not removed:
+        return 0
+    
+    idx = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', idx)
+    idx = lut[np.minimum(idx, len(lut) - 1)]
+    
+    mesh.materials.clear()
+    for mat in kept:
+        mesh.materials.append(mat)
+    
+    mesh.polygons.foreach_set('material_index', idx)
+    mesh.update()
+    return removed
+
+def consolidate_materials(meshes):
+    # Helps reduce the number of duplicate materials by consolidating ones that
+    # share the same textures and shading parameters
     log("Analyzing materials for consolidation...")
     
-    # Group materials by their base name (without .001, .002 etc. suffixes)
+    # Group materials by content rather than by name, which catches copies
+    # with unrelated names and never merges same-named materials that differ
     material_groups = {}
     consolidated = 0
     
@@ -135,61 +201,94 @@ def consolidate_materials():
         if not mat.name:
             continue
             
-        # Extract base name by removing Blender's numeric suffix if present
-        base_name = get_base_name(mat.name)
-            
-        # Group materials by their base name
-        if base_name not in material_groups:
-            material_groups[base_name] = []
-        material_groups[base_name].append(mat)
-    
-    # For each group of materials with the same base name
-    for base_name, materials in material_groups.items():
-        if len(materials) > 1:
-            # Sort materials so that ones without suffix come first
-            materials.sort(key=lambda m: m.name)
-            
-            # Use the first material as the primary one
-            primary_mat = materials[0]
-            
-            # Replace all other materials with the primary
-            for duplicate in materials[1:]:
-                # Find all objects using this duplicate material
-                for obj in bpy.context.scene.objects:
-                    if obj.type == 'MESH':
-                        for slot in obj.material_slots:
-                            if slot.material == duplicate:
-                                log(f"Replacing material {duplicate.name} with {primary_mat.name} on {obj.name}")
-                                slot.material = primary_mat
-                                consolidated += 1
+        key = material_key(mat)
+        if key not in material_groups:
+            material_groups[key] = []
+        material_groups[key].append(mat)
+    
+    # Nothing to do on a clean export - skip the scene scan entirely
+    if not any(len(materials) > 1 for materials in material_groups.values()):
+        log("No duplicate materials found")
+        return 0
+    
+    # Index every slot by the material it holds, so each duplicate can be
+    # replaced directly instead of rescanning the whole scene for it
+    slot_index = defaultdict(list)
+    for obj in meshes:
+        for i, slot in enumerate(obj.material_slots):
+            if slot.material:
+                slot_index[slot.material].append((obj, i))
+    touched_meshes = set()
+    unused_materials = []
+    
+    # Every slot assignment would otherwise push an undo step, which adds up
+    # quickly on big scenes - the fixer never needs to undo anything
+    edit_prefs = bpy.context.preferences.edit
+    prev_undo = edit_prefs.use_global_undo
+    edit_prefs.use_global_undo = False
+    try:
+        # For each group of identical materials
+        for key, materials in material_groups.items():
+            if len(materials) > 1:
+                # Prefer a material without a .001 suffix, then the shortest name
+                materials.sort(key=lambda m: (m.name != get_base_name(m.name), len(m.name), m.name))
+                
+                # Use the first material as the primary one
+                primary_mat = materials[0]
+                
+                # Replace all other materials with the primary. user_remap
+                # repoints every reference to the duplicate in one call; the
+                # slot index only tells us which meshes need compacting.
+                for duplicate in materials[1:]:
+                    users = slot_index.pop(duplicate, ())
+                    log(f"Replacing material {duplicate.name} with {primary_mat.name} in {len(users)} slots")
+                    for obj, i in users:
+                        touched_meshes.add(obj.data)
+                    duplicate.user_remap(primary_mat)
+                    unused_materials.append(duplicate)
+                    consolidated += len(users)
+        
+        # The duplicates have no users left
+        if unused_materials:
+            bpy.data.batch_remove(ids=unused_materials)
+        
+        # Drop the slots that now repeat a material
+        removed_slots = sum(compact_mesh_materials(mesh) for mesh in touched_meshes)
+    finally:
+        edit_prefs.use_global_undo = prev_undo
     
     log(f"Consolidated {consolidated} material references")
+    log(f"Removed {removed_slots} redundant material slots")
     return consolidated
 
-def main():
-    # Check arguments
-    args = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
-    if not args:
-        log("No FBX file specified")
-        return
-        
-    fbx_path = args[0]
-    
+def fix_fbx_file(fbx_path):
+    # Fix a single FBX file in place, starting from an empty scene
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+
     # Import the FBX file
     log(f"Importing FBX file: {fbx_path}")
     try:
         bpy.ops.import_scene.fbx(filepath=fbx_path)
     except Exception as e:
         log(f"Error importing FBX: {e}")
-        return
+        return False
+    
+    # Collect the objects both passes work on in a single walk over the scene
+    meshes = []
+    model_roots = []
+    for obj in bpy.context.scene.objects:
+        if obj.type == 'MESH':
+            meshes.append(obj)
+        elif obj.type == 'EMPTY' and not obj.parent:
+            model_roots.append(obj)
     
     # Fix duplicate materials
     log("Fixing duplicate materials...")
-    consolidated = consolidate_materials()
+    consolidated = consolidate_materials(meshes)
     
     # Clean up hierarchy issues
     log("Cleaning hierarchy structure...")
-    fixed_hierarchy = clean_hierarchy()
+    fixed_hierarchy = clean_hierarchy(model_roots, meshes)
     
     # Export the fixed FBX
     log(f"Exporting fixed FBX file: {fbx_path}")
@@ -211,11 +310,33 @@ def main():
         log(f"Successfully exported fixed FBX file")
     except Exception as e:
         log(f"Error exporting FBX: {e}")
+        return False
+
+    return True
+
+def main():
+    # Check arguments - every FBX file after "--" is fixed in this one Blender session
+    args = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    if not args:
+        log("No FBX file specified")
         return
 
+    failed = [fbx_path for fbx_path in args if not fix_fbx_file(fbx_path)]
+
+    log(f"Fixed {len(args) - len(failed)} of {len(args)} FBX files")
+    if failed:
+        for fbx_path in failed:
+            log(f"Failed: {fbx_path}")
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
 '''
+
+def create_blender_fixer_script():
+    """Write the fixer script to disk for callers that want a file to pass to Blender."""
+    script_path = os.path.join("exports", "fix_materials_script.py")
+    script_content = FIXER_SCRIPT
     
     # Create the directory if it doesn't exist
     os.makedirs(os.path.dirname(script_path), exist_ok=True)
@@ -226,66 +347,155 @@ if __name__ == "__main__":
     
     return script_path
 
-def run_blender_with_script(fbx_path, script_path):
-    """Run Blender with the fixer script."""
-    
-    # Search for Blender executable
-    blender_path = None
-    possible_blender_paths = [
-        r'C:\Program Files\Blender Foundation\Blender 4.3\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 3.6\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 3.5\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 3.4\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 3.3\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 3.2\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 3.1\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 3.0\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 2.9\blender.exe',
-        r'C:\Program Files\Blender Foundation\Blender 2.8\blender.exe',
-        '/Applications/Blender.app/Contents/MacOS/Blender',
-        'blender'  # Try system PATH
-    ]
-    
-    print("\nSearching for Blender...")
-    for path in possible_blender_paths:
-        try:
-            # Check if Blender exists at this path
-            if os.path.exists(path):
-                print(f"Found Blender at: {path}")
-                blender_path = path
-                break
-            elif shutil.which(path):
-                resolved_path = shutil.which(path)
-                print(f"Found Blender in PATH at: {resolved_path}")
-                blender_path = resolved_path
-                break
-        except Exception as e:
-            print(f"Error checking path {path}: {str(e)}")
-            continue
-    
+def _load_cached_blender():
+    """Return the Blender path cached by a previous run, or None if stale."""
+    try:
+        with open(BLENDER_CACHE_PATH, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # The cache is only valid on the platform that wrote it
+    if cached.get('platform') != platform.system():
+        return None
+
+    blender_path = cached.get('path')
+    if blender_path and os.path.isfile(blender_path):
+        return blender_path
+    return None
+
+def _save_cached_blender(blender_path):
+    """Remember the resolved Blender path for later runs."""
+    try:
+        os.makedirs(os.path.dirname(BLENDER_CACHE_PATH), exist_ok=True)
+        with open(BLENDER_CACHE_PATH, 'w') as f:
+            json.dump({'path': blender_path, 'platform': platform.system()}, f)
+    except OSError as e:
+        print(f"Warning: Could not cache Blender path: {str(e)}")
+
+def run_blender_with_script(fbx_path, script_path=None):
+    """Run Blender with the fixer script.
+
+    fbx_path may be a single path or a list of paths; all of them are fixed
+    in one Blender session so startup is only paid once. Without script_path
+    the built-in FIXER_SCRIPT is passed inline.
+    """
+    fbx_paths = [fbx_path] if isinstance(fbx_path, str) else list(fbx_path)
+
+    # Reuse the path found by a previous run if it is still there
+    blender_path = _load_cached_blender()
+    if blender_path:
+        print(f"\nUsing cached Blender path: {blender_path}")
+    else:
+        blender_path = find_blender()
+        if blender_path:
+            _save_cached_blender(blender_path)
+
     if not blender_path:
         print("Error: Blender not found. Cannot fix materials.")
         return False
-    
+
     # Run Blender with the script
+    if script_path:
+        script_args = ['--python', script_path]
+    else:
+        script_args = ['--python-expr', FIXER_SCRIPT]
     cmd = [
         blender_path,
         '--background',
-        '--python', script_path,
+        *script_args,
         '--',  # Separator for script arguments
-        fbx_path
+        *fbx_paths
     ]
-    
-    print(f"Running Blender to fix materials in FBX file: {fbx_path}")
+
+    if len(fbx_paths) == 1:
+        print(f"Running Blender to fix materials in FBX file: {fbx_paths[0]}")
+    else:
+        print(f"Running Blender to fix materials in {len(fbx_paths)} FBX files")
     try:
-        subprocess.run(cmd, check=True)
-        print("Material fixing completed successfully")
-        return True
-    except subprocess.CalledProcessError as e:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            # Blender prints UTF-8 whatever the console code page is
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+    except OSError as e:
         print(f"Error running Blender: {e}")
         return False
 
+    # Kill Blender if a single file takes too long, so one broken FBX can't
+    # hang a whole batch. The clock restarts whenever the fixer starts a file.
+    deadline = [time.monotonic() + BLENDER_FILE_TIMEOUT]
+    timed_out = threading.Event()
+
+    def watchdog():
+        while process.poll() is None:
+            if time.monotonic() > deadline[0]:
+                timed_out.set()
+                process.kill()
+                return
+            time.sleep(1)
+
+    threading.Thread(target=watchdog, daemon=True).start()
+
+    streamed = False
+    try:
+        for line in process.stdout:
+            sys.stdout.write(line)
+            if line.startswith("[FIXER] Importing FBX file:"):
+                deadline[0] = time.monotonic() + BLENDER_FILE_TIMEOUT
+        streamed = True
+    finally:
+        # If streaming failed, don't leave Blender running without anyone
+        # reading its output. After a normal end of output it's just exiting.
+        if not streamed and process.poll() is None:
+            process.kill()
+        process.wait()
+
+    if timed_out.is_set():
+        print(f"Error running Blender: no progress for {BLENDER_FILE_TIMEOUT} seconds, process killed")
+        return False
+    if process.returncode != 0:
+        print(f"Error running Blender: exit code {process.returncode}")
+        return False
+
+    print("Material fixing completed successfully")
+    return True
+
+def _blender_version_key(path):
+    """Sort key that orders Blender install paths by their version number."""
+    return [int(part) for part in re.findall(r'\d+', path)]
+
+def find_blender():
+    """Search the usual install locations for the Blender executable."""
+    print("\nSearching for Blender...")
+    
+    # Only look where Blender installs itself on this platform; globbing the
+    # install folder finds every version (including new ones) in one listing
+    system = platform.system()
+    if system == 'Windows':
+        pattern = r'C:\Program Files\Blender Foundation\Blender*\blender.exe'
+    elif system == 'Darwin':
+        pattern = '/Applications/Blender*.app/Contents/MacOS/Blender'
+    else:
+        pattern = None
+    
+    if pattern:
+        # Newest version first
+        candidates = sorted(glob.glob(pattern), key=_blender_version_key, reverse=True)
+        if candidates:
+            print(f"Found Blender at: {candidates[0]}")
+            return candidates[0]
+    
+    # Try system PATH
+    resolved_path = shutil.which('blender')
+    if resolved_path:
+        print(f"Found Blender in PATH at: {resolved_path}")
+    return resolved_path
+
 def main():
     """Main entry point."""
     print_header("DIGGLES MODEL DUPLICATE MATERIAL FIXER", "#")
@@ -297,16 +507,17 @@ def main():
         epilog="""
 Examples:
   python fix_duplicate_materials.py exports/fbx/odin.fbx
+  python fix_duplicate_materials.py exports/fbx/odin.fbx exports/fbx/troll.fbx
   python fix_duplicate_materials.py --model assets/models/troll.3db
         """
     )
-    parser.add_argument('fbx_path', nargs='?', help='Path to the .fbx file to fix')
+    parser.add_argument('fbx_path', nargs='*', help='Path(s) to the .fbx file(s) to fix')
     parser.add_argument('--model', help='Path to the .3db model (will fix its corresponding FBX file)')
     
     args = parser.parse_args()
     
-    # Determine the FBX path
-    fbx_path = args.fbx_path
+    # Determine the FBX paths
+    fbx_paths = list(args.fbx_path)
     
     # If --model is provided, find the corresponding FBX file
     if args.model:
@@ -324,31 +535,27 @@ Examples:
         
         # Get model name from path and construct FBX path
         model_name = os.path.splitext(os.path.basename(model_path))[0]
-        fbx_path = os.path.join("exports", "fbx", f"{model_name}.fbx")
+        fbx_paths.append(os.path.join("exports", "fbx", f"{model_name}.fbx"))
     
     # Ensure we have an FBX path
-    if not fbx_path:
+    if not fbx_paths:
         print("Error: No FBX file specified")
         return
     
-    # Check if the FBX file exists
-    if not os.path.exists(fbx_path):
-        print(f"Error: FBX file not found: {fbx_path}")
+    # Check if the FBX files exist
+    missing = [fbx_path for fbx_path in fbx_paths if not os.path.exists(fbx_path)]
+    if missing:
+        for fbx_path in missing:
+            print(f"Error: FBX file not found: {fbx_path}")
         return
     
-    # Create the Blender script
-    script_path = create_blender_fixer_script()
-    
-    # Run Blender with the script
-    success = run_blender_with_script(fbx_path, script_path)
-    
-    # Clean up
-    if os.path.exists(script_path):
-        os.remove(script_path)
+    # Run Blender with the fixer script
+    success = run_blender_with_script(fbx_paths)
     
     if success:
         print_header("MATERIAL FIXING COMPLETED SUCCESSFULLY", "#")
-        print(f"FBX file fixed: {fbx_path}")
+        for fbx_path in fbx_paths:
+            print(f"FBX file fixed: {fbx_path}")
     else:
         print_header("MATERIAL FIXING FAILED", "#")
 
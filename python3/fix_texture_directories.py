@@ -20,7 +20,21 @@ import os
 import sys
 import shutil
 import glob
-import re
+import hashlib
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Text that only exists in a file once its patch has been applied
+EXPORT_FBX_BINARY_MARKER = "# Completely remove the textures directory instead"
+EXPORT_PY_MARKER = "# Extract model name for FBM directory"
+BLENDER_SCRIPT_MARKER = "STRICT MODE: No fallback"
+
+# Digest of every file as this script last wrote it, used to notice files
+# that were edited again after being patched
+PATCH_STATE_PATH = os.path.join("exports", ".texture_patches.json")
+patch_state = {}
 
 def print_header(message):
     """Print a formatted header message."""
@@ -52,12 +66,11 @@ def clean_texture_directories():
                 
                 # Try to remove files individually if rmtree fails
                 try:
-                    files = os.listdir(directory)
-                    for file in files:
-                        file_path = os.path.join(directory, file)
-                        if os.path.isfile(file_path):
-                            os.remove(file_path)
-                            print(f"  ✓ Removed file: {file_path}")
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_file():
+                                os.remove(entry.path)
+                                print(f"  ✓ Removed file: {entry.path}")
                     
                     # Try to remove the empty directory
                     os.rmdir(directory)
@@ -65,6 +78,60 @@ def clean_texture_directories():
                 except Exception as e2:
                     print(f"  ✗ Failed to clean {directory} individually: {e2}")
 
+def load_patch_state():
+    """Load the digests recorded by a previous run."""
+    try:
+        with open(PATCH_STATE_PATH, 'r', encoding='utf-8') as f:
+            patch_state.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+def save_patch_state():
+    """Store the digests of the patched files."""
+    try:
+        os.makedirs(os.path.dirname(PATCH_STATE_PATH), exist_ok=True)
+        with open(PATCH_STATE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(patch_state, f, indent=2)
+    except OSError as e:
+        print(f"✗ Could not save patch state: {e}")
+
+def content_digest(content):
+    """Return the sha256 of a file's text content."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def already_patched(file_path, content, marker):
+    """Return True if the file already carries its patch, so it can be skipped."""
+    if marker not in content:
+        return False
+    
+    digest = content_digest(content)
+    recorded = patch_state.get(file_path)
+    if recorded and recorded != digest:
+        print(f"! {file_path} has changed since it was patched")
+    patch_state[file_path] = digest
+    
+    print(f"✓ Already patched, skipping: {file_path}")
+    return True
+
+def write_patched(file_path, content):
+    """Write a patched file and remember its digest."""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    patch_state[file_path] = content_digest(content)
+
+def replace_block(content, old, new, description):
+    """Replace an exact block of source code, reporting whether it was found."""
+    # Several replacements start with the block they replace, so check for
+    # the new code first to keep re-runs from applying them twice
+    if new in content:
+        print(f"- Skipped (already applied): {description}")
+        return content
+    if old not in content:
+        print(f"- Skipped (not found): {description}")
+        return content
+    print(f"✓ Patched: {description}")
+    return content.replace(old, new)
+
 def patch_export_fbx_binary():
     """Patch the export_fbx_binary.py file to use .fbm directory."""
     print_header("PATCHING EXPORT_FBX_BINARY.PY")
@@ -77,6 +144,10 @@ def patch_export_fbx_binary():
     with open(file_path, 'r', encoding='utf-8') as f:
         content = f.read()
     
+    # Nothing to do if an earlier run already patched this file
+    if already_patched(file_path, content, EXPORT_FBX_BINARY_MARKER):
+        return True
+    
     # Count original occurrences of textures directory creation
     textures_dir_count = content.count("target_dir = os.path.join(export_dir, 'textures')")
     print(f"Found {textures_dir_count} occurrences of textures directory creation")
@@ -84,16 +155,16 @@ def patch_export_fbx_binary():
     # 1. Replace textures directory clearing with complete removal
     old_clearing = (
         "# Clear the textures directory to avoid using old textures\n"
-        "        textures_dir = os.path.join\\(export_dir, 'textures'\\)\n"
-        "        if os.path.exists\\(textures_dir\\):\n"
-        "            for file in os.listdir\\(textures_dir\\):\n"
-        "                file_path = os.path.join\\(textures_dir, file\\)\n"
-        "                if os.path.isfile\\(file_path\\):\n"
+        "        textures_dir = os.path.join(export_dir, 'textures')\n"
+        "        if os.path.exists(textures_dir):\n"
+        "            for file in os.listdir(textures_dir):\n"
+        "                file_path = os.path.join(textures_dir, file)\n"
+        "                if os.path.isfile(file_path):\n"
         "                    try:\n"
-        "                        os.remove\\(file_path\\)\n"
-        "                        print\\(f\"Removed old texture: {file_path}\"\\)\n"
+        "                        os.remove(file_path)\n"
+        "                        print(f\"Removed old texture: {file_path}\")\n"
         "                    except Exception as e:\n"
-        "                        print\\(f\"Error removing {file_path}: {e}\"\\)"
+        "                        print(f\"Error removing {file_path}: {e}\")"
     )
     
     new_clearing = (
@@ -107,14 +178,14 @@ def patch_export_fbx_binary():
         "                print(f\"Error removing directory {textures_dir}: {e}\")\n"
         "                # If rmtree fails, try to remove files individually\n"
         "                try:\n"
-        "                    for file in os.listdir(textures_dir):\n"
-        "                        file_path = os.path.join(textures_dir, file)\n"
-        "                        if os.path.isfile(file_path):\n"
-        "                            try:\n"
-        "                                os.remove(file_path)\n"
-        "                                print(f\"Removed old texture: {file_path}\")\n"
-        "                            except Exception as e2:\n"
-        "                                print(f\"Error removing {file_path}: {e2}\")\n"
+        "                    with os.scandir(textures_dir) as entries:\n"
+        "                        for entry in entries:\n"
+        "                            if entry.is_file():\n"
+        "                                try:\n"
+        "                                    os.remove(entry.path)\n"
+        "                                    print(f\"Removed old texture: {entry.path}\")\n"
+        "                                except Exception as e2:\n"
+        "                                    print(f\"Error removing {entry.path}: {e2}\")\n"
         "                except Exception as e3:\n"
         "                    print(f\"Error listing files in {textures_dir}: {e3}\")\n"
         "                \n"
@@ -126,24 +197,26 @@ def patch_export_fbx_binary():
         "                    print(f\"Could not remove directory {textures_dir}: {e4}\")"
     )
     
-    # Use regex for more flexible matching
-    content = re.sub(old_clearing, new_clearing, content)
+    content = replace_block(content, old_clearing, new_clearing, "textures directory clearing")
     
     # 2. Replace texture directory creation with FBM directory creation
-    content = content.replace(
+    content = replace_block(
+        content,
         "target_dir = os.path.join(export_dir, 'textures')",
-        "target_dir = os.path.join(export_dir, f\"{model_name}.fbm\")"
+        "target_dir = os.path.join(export_dir, f\"{model_name}.fbm\")",
+        "texture directory creation"
     )
     
     # 3. Replace texture map references to point to FBM
-    content = content.replace(
+    content = replace_block(
+        content,
         "texture_map[material_name] = os.path.join('textures', target_filename)",
-        "texture_map[material_name] = os.path.join(f\"{model_name}.fbm\", target_filename)"
+        "texture_map[material_name] = os.path.join(f\"{model_name}.fbm\", target_filename)",
+        "texture map references"
     )
     
     # Write the modified content back
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    write_patched(file_path, content)
     
     print(f"✓ Successfully patched: {file_path}")
     return True
@@ -160,8 +233,21 @@ def patch_export_py():
     with open(file_path, 'r', encoding='utf-8') as f:
         content = f.read()
     
+    # Nothing to do if an earlier run already patched this file
+    if already_patched(file_path, content, EXPORT_PY_MARKER):
+        return True
+    
+    # Replace the function definition and texture directory creation
+    old_function_def = '''def copy_textures_for_export(model: Model, export_dir: str) -> Dict[str, str]:
+    """Copy textures to the export directory and return a mapping of material names to texture paths."""
+    texture_export_dir = os.path.join(export_dir, 'textures')
+    os.makedirs(texture_export_dir, exist_ok=True)
+    
+    # Debug information
+    print(f"Copying textures to: {texture_export_dir}")'''
+    
     # Insert model name extraction near the start of copy_textures_for_export function
-    model_extraction_code = """def copy_textures_for_export(model: Model, export_dir: str) -> Dict[str, str]:
+    model_extraction_code = '''def copy_textures_for_export(model: Model, export_dir: str) -> Dict[str, str]:
     """Copy textures to the export directory and return a mapping of material names to texture paths."""
     # Extract model name for FBM directory
     model_basename = ""
@@ -196,22 +282,20 @@ def patch_export_py():
     texture_export_dir = fbm_dir
     
     # Debug information
-    print(f"Copying textures to FBM directory: {texture_export_dir}")"""
+    print(f"Copying textures to FBM directory: {texture_export_dir}")'''
     
-    # Replace the function definition and texture directory creation
-    old_function_def = r"def copy_textures_for_export\(model: Model, export_dir: str\) -> Dict\[str, str\]:[\r\n\s]+\"\"\"Copy textures to the export directory and return a mapping of material names to texture paths\.\"\"\"[\r\n\s]+texture_export_dir = os\.path\.join\(export_dir, 'textures'\)[\r\n\s]+os\.makedirs\(texture_export_dir, exist_ok=True\)[\r\n\s]+# Debug information[\r\n\s]+print\(f\"Copying textures to: {texture_export_dir}\"\)"
-    
-    content = re.sub(old_function_def, model_extraction_code, content)
+    content = replace_block(content, old_function_def, model_extraction_code, "copy_textures_for_export header")
     
     # Replace texture path references in the texture map
-    old_map_entry = r"texture_map\[material\.name\] = os\.path\.join\('textures', target_filename\)"
-    new_map_entry = r"texture_map[material.name] = os.path.join(f\"{model_basename}.fbm\", target_filename)"
-    
-    content = re.sub(old_map_entry, new_map_entry, content)
+    content = replace_block(
+        content,
+        "texture_map[material.name] = os.path.join('textures', target_filename)",
+        "texture_map[material.name] = os.path.join(f\"{model_basename}.fbm\", target_filename)",
+        "texture map references"
+    )
     
     # Write the modified content back
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    write_patched(file_path, content)
     
     print(f"✓ Successfully patched: {file_path}")
     return True
@@ -228,9 +312,17 @@ def enhance_blender_script():
     with open(file_path, 'r', encoding='utf-8') as f:
         content = f.read()
     
+    # Nothing to do if an earlier run already patched this file
+    if already_patched(file_path, content, BLENDER_SCRIPT_MARKER):
+        return True
+    
     # Enhance get_texture_for_model_part to strictly prioritize .fbm directory
     # Look for current fbm path resolution code
-    fbm_resolution_pattern = r"# Check if we have a model-specific FBM directory[\r\n\s]+model_name = os\.environ\.get\(\"MODEL_NAME\", \"\"\)[\r\n\s]+if model_name:[\r\n\s]+# Try the FBM directory first[\r\n\s]+fbm_path = os\.path\.join\(os\.getcwd\(\), \"exports\", \"fbx\", f\"{model_name}\.fbm\"\)"
+    fbm_resolution_code = """    # Check if we have a model-specific FBM directory
+    model_name = os.environ.get("MODEL_NAME", "")
+    if model_name:
+        # Try the FBM directory first
+        fbm_path = os.path.join(os.getcwd(), "exports", "fbx", f"{model_name}.fbm")"""
     
     enhanced_fbm_code = """    # Check if we have a model-specific FBM directory
     model_name = os.environ.get("MODEL_NAME", "")
@@ -245,11 +337,16 @@ def enhance_blender_script():
         else:
             print(f"WARNING: FBM directory not found: {fbm_path}")"""
     
-    content = re.sub(fbm_resolution_pattern, enhanced_fbm_code, content)
+    content = replace_block(content, fbm_resolution_code, enhanced_fbm_code, "FBM directory resolution")
     
     # Force the use of .fbm directory for textures by blocking other directories
     # Find the texture search logic
-    texture_search_pattern = r"# Check the FBM directory[\r\n\s]+if os\.path\.exists\(fbm_path\):[\r\n\s]+fbm_texture = os\.path\.join\(fbm_path, texture_name\)[\r\n\s]+if os\.path\.exists\(fbm_texture\):[\r\n\s]+print\(f\"Found texture in FBM directory: {fbm_texture}\"\)[\r\n\s]+return fbm_texture"
+    texture_search_code = """            # Check the FBM directory
+            if os.path.exists(fbm_path):
+                fbm_texture = os.path.join(fbm_path, texture_name)
+                if os.path.exists(fbm_texture):
+                    print(f"Found texture in FBM directory: {fbm_texture}")
+                    return fbm_texture"""
     
     enhanced_search_code = """            # Check the FBM directory
             if os.path.exists(fbm_path):
@@ -293,32 +390,72 @@ def enhance_blender_script():
                     print(f"STRICT MODE: No fallback - using placeholder for {texture_name}")
                     return None"""
     
-    content = re.sub(texture_search_pattern, enhanced_search_code, content)
+    content = replace_block(content, texture_search_code, enhanced_search_code, "FBM texture search")
     
     # Add better handling for material name suffixes (.392)
-    material_cleanup_pattern = r"# Clean material name for matching[\r\n\s]+material_clean = material_name"
+    material_cleanup_code = """    # Clean material name for matching
+    material_clean = material_name"""
     
     enhanced_material_code = """    # Clean material name for matching
     material_clean = material_name
     
     # Special handling for numeric suffixes (like "kris_4_burg_a.392")
     # Extract base material name without numeric suffix
-    base_match = re.match(r'([a-zA-Z0-9_]+(?:_[a-zA-Z0-9_]+)*)(?:\.\d+)?$', material_clean)
+    base_match = re.match(r'([a-zA-Z0-9_]+(?:_[a-zA-Z0-9_]+)*)(?:\\.\\d+)?$', material_clean)
     if base_match:
         material_base = base_match.group(1)
         if material_base != material_clean:
             print(f"Extracted base material name: {material_base} from {material_clean}")
             material_clean = material_base"""
     
-    content = re.sub(material_cleanup_pattern, enhanced_material_code, content)
+    content = replace_block(content, material_cleanup_code, enhanced_material_code, "material name cleanup")
     
     # Write the modified content back
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    write_patched(file_path, content)
     
     print(f"✓ Successfully enhanced: {file_path}")
     return True
 
+
+class _ThreadOutput:
+    """Stand-in for sys.stdout that keeps each worker thread's output separate."""
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+    
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer or self.stream).write(text)
+    
+    def flush(self):
+        self.stream.flush()
+
+def run_patches(patches):
+    """Run independent patch functions concurrently, printing their output in order."""
+    output = _ThreadOutput(sys.stdout)
+    
+    def run(patch):
+        output.local.buffer = io.StringIO()
+        try:
+            return patch(), output.local.buffer.getvalue()
+        except Exception as e:
+            print(f"✗ {patch.__name__} failed: {e}")
+            return False, output.local.buffer.getvalue()
+        finally:
+            output.local.buffer = None
+    
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=len(patches)) as executor:
+            results = list(executor.map(run, patches))
+    finally:
+        sys.stdout = output.stream
+    
+    for _, text in results:
+        sys.stdout.write(text)
+    return [result for result, _ in results]
+
 def main():
     """Main function to run all fixes."""
     print_header("TEXTURE DIRECTORY FIXER")
@@ -327,10 +464,10 @@ def main():
     # Clean up existing texture directories
     clean_texture_directories()
     
-    # Patch the export files
-    patch_export_fbx_binary()
-    patch_export_py()
-    enhance_blender_script()
+    # Patch the export files - each one touches a different file
+    load_patch_state()
+    run_patches([patch_export_fbx_binary, patch_export_py, enhance_blender_script])
+    save_patch_state()
     
     print_header("FIXES COMPLETED")
     print("The texture directory issues have been fixed.")
@@ -1,7 +1,11 @@
 import os
-import struct
-import operator
+import re
+import gzip
 import shutil
+import functools
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
 from gltflib import (
     GLTF, GLTFModel, Asset, Scene, Node, Mesh, Primitive, Attributes, Buffer, BufferView, Accessor, AccessorType,
     BufferTarget, ComponentType, GLBResource, FileResource)
@@ -9,12 +13,89 @@ from gltflib import (
 from lib.parse_3db import Model
 from typing import List, Dict, Tuple, Optional
 
+# Below this many distinct links, encoding them in worker processes costs more
+# in process start-up and pickling than it saves
+PARALLEL_ENCODE_MIN_LINKS = 2000
+
+# Blosc is optional; compressed buffer sidecars fall back to gzip without it
+try:
+    import blosc
+except ImportError:
+    blosc = None
+
+# Directories searched by find_matching_textures. Order matters - higher resolution first
+MATCH_SEARCH_DIRS = (
+    # High resolution textures first
+    os.path.join('assets', 'textures', 'm256'),
+    
+    # Medium resolution textures next
+    os.path.join('assets', 'textures', 'm128'),
+    
+    # Low resolution textures
+    os.path.join('assets', 'textures', 'm064'),
+    os.path.join('assets', 'textures', 'm032'),
+    
+    # Special directories
+    os.path.join('assets', 'textures', 'Gray'),
+    os.path.join('assets', 'textures', 'ClassIcons'),
+    
+    # Main texture directory last
+    os.path.join('assets', 'textures'),
+)
+
+# Every directory get_texture_path searches, in order
+TEXTURE_SEARCH_DIRS = (
+    # Core asset directories
+    os.path.join('assets', 'textures', 'm256'),
+    os.path.join('assets', 'textures', 'm128'),
+    os.path.join('assets', 'textures', 'm064'),
+    os.path.join('assets', 'textures', 'm032'),
+    os.path.join('assets', 'textures', 'ClassIcons'),
+    os.path.join('assets', 'textures', 'Gray'),
+    os.path.join('assets', 'textures', 'Misc'),
+    os.path.join('assets', 'textures'),
+    
+    # Parent directories (for different working directory cases)
+    os.path.join('..', 'assets', 'textures', 'm256'),
+    os.path.join('..', 'assets', 'textures', 'm128'),
+    os.path.join('..', 'assets', 'textures', 'm064'),
+    os.path.join('..', 'assets', 'textures', 'm032'),
+    os.path.join('..', 'assets', 'textures', 'ClassIcons'),
+    os.path.join('..', 'assets', 'textures', 'Gray'),
+    os.path.join('..', 'assets', 'textures', 'Misc'),
+    os.path.join('..', 'assets', 'textures'),
+    
+    # Export directories
+    os.path.join('exports', 'fbx', 'textures'),
+    os.path.join('exports', 'gltf', 'textures'),
+)
+
+# Known locations of the baby texture, checked before the general search
+BABY_TEXTURE_DIRS = (
+    os.path.join('assets', 'textures', 'm128'),
+    os.path.join('assets', 'textures', 'm064'),
+    os.path.join('assets', 'textures', 'Gray'),
+)
+
+# Set to True to print every texture lookup and material usage detail.
+# Off by default: for models with hundreds of materials these per-candidate
+# messages were most of the export's console output.
+DEBUG = False
+
+# Index of the textures in MATCH_SEARCH_DIRS, built on first use
+_texture_index = None
+
+# Matches everything clean_material_name strips: the "b" of a b'...' wrapper
+# and every quote character
+_CLEAN_RE = re.compile(r"^b(?=')(?=.*'\Z)|['\"]", re.DOTALL)
+
 def transform_point(p: Tuple[float, float, float]) -> Tuple[float, float, float]:
     """Transform a point from the .3db coordinate system to a more standard one."""
     scale = 100
     result = ((p[0] - 0.5) * scale, (p[1] - 0.5) * scale, (p[2] - 0.5) * scale)
     return result
 
+@functools.lru_cache(maxsize=4096)
 def extract_texture_filename(texture_path: str) -> str:
     """Extract just the filename from a texture path."""
     # Ensure texture_path is a string
@@ -27,6 +108,75 @@ def extract_texture_filename(texture_path: str) -> str:
     
     return os.path.basename(texture_path)
 
+@functools.lru_cache(maxsize=None)
+def _listdir_lower(dir_path: str) -> Optional[Dict[str, str]]:
+    """List a directory once, mapping lowercase file names to their real names.
+
+    Only regular files are listed. Returns None if the directory doesn't exist
+    or can't be read. The result is cached, so texture lookups for every
+    material share a single scan.
+    """
+    try:
+        with os.scandir(dir_path) as it:
+            return {entry.name.lower(): entry.name for entry in it if entry.is_file()}
+    except OSError:
+        return None
+
+def reset_texture_cache():
+    """Forget cached directory listings, e.g. after textures were added or removed."""
+    global _texture_index
+    _listdir_lower.cache_clear()
+    get_texture_path.cache_clear()
+    _texture_index = None
+
+def _resolution_category(directory: str) -> str:
+    """Return the resolution bucket find_matching_textures sorts a directory into."""
+    if 'm256' in directory:
+        return 'm256'
+    elif 'm128' in directory:
+        return 'm128'
+    elif 'm064' in directory:
+        return 'm064'
+    return 'other'
+
+def _build_texture_index() -> Dict[str, list]:
+    """Scan the texture directories once and index every image in them.
+
+    'files' holds (lowercase name, path, resolution) for each image in search
+    order; 'by_stem' groups the same entries by the lowercase name up to the
+    first dot, which is what exact matches compare against.
+    """
+    files = []
+    by_stem = {}
+    for directory in MATCH_SEARCH_DIRS:
+        dir_contents = _listdir_lower(directory)
+        if dir_contents is None:
+            continue
+        
+        resolution = _resolution_category(directory)
+        for filename_lower, filename in dir_contents.items():
+            if not filename_lower.endswith(('.tga', '.png', '.jpg')):
+                continue
+            
+            entry = (filename_lower, os.path.join(directory, filename), resolution)
+            files.append(entry)
+            by_stem.setdefault(filename_lower.split('.')[0], []).append(entry)
+    
+    return {'files': files, 'by_stem': by_stem}
+
+def _get_texture_index() -> Dict[str, list]:
+    """Return the texture index, building it on first use."""
+    global _texture_index
+    if _texture_index is None:
+        _texture_index = _build_texture_index()
+    return _texture_index
+
+def _lookup_in_listing(dir_path: str, dir_contents: Dict[str, str], filename: str) -> Optional[str]:
+    """Case-insensitively resolve a file name against a cached directory listing."""
+    actual = dir_contents.get(filename.lower())
+    return os.path.join(dir_path, actual) if actual else None
+
+@functools.lru_cache(maxsize=4096)
 def get_texture_path(texture_name: str) -> Optional[str]:
     """Get the full path to a texture file."""
     # Ensure texture_name is a string
@@ -38,52 +188,24 @@ def get_texture_path(texture_name: str) -> Optional[str]:
             return None
     
     # Print debug information
-    print(f"Looking for texture: {texture_name}")
+    if DEBUG:
+        print(f"Looking for texture: {texture_name}")
     
     # Try common case-specific filenames first before any general search
     if texture_name.lower().endswith("character_zbaby_a.tga") or texture_name.lower() == "character_zbaby_a.tga":
         # Direct check for known baby texture locations
-        specific_baby_paths = [
-            os.path.join('assets', 'textures', 'm128', 'Character_ZBaby_a.tga'),
-            os.path.join('assets', 'textures', 'm064', 'Character_ZBaby_a.tga'),
-            os.path.join('assets', 'textures', 'Gray', 'Character_ZBaby_a.tga')
-        ]
-        
-        for path in specific_baby_paths:
-            if os.path.exists(path):
-                print(f"Found baby texture at hardcoded path: {path}")
+        for dir_path in BABY_TEXTURE_DIRS:
+            dir_contents = _listdir_lower(dir_path)
+            path = dir_contents and _lookup_in_listing(dir_path, dir_contents, 'Character_ZBaby_a.tga')
+            if path:
+                if DEBUG:
+                    print(f"Found baby texture at hardcoded path: {path}")
                 return path
     
     # Extract just the filename without path
     texture_name = os.path.basename(texture_name)
     base_name = os.path.splitext(texture_name)[0]
     
-    # Build a list of all potential search directories
-    search_dirs = [
-        # Core asset directories
-        os.path.join('assets', 'textures', 'm256'),
-        os.path.join('assets', 'textures', 'm128'),
-        os.path.join('assets', 'textures', 'm064'),
-        os.path.join('assets', 'textures', 'm032'),
-        os.path.join('assets', 'textures', 'ClassIcons'),
-        os.path.join('assets', 'textures', 'Gray'),
-        os.path.join('assets', 'textures', 'Misc'),
-        os.path.join('assets', 'textures'),
-        
-        # Parent directories (for different working directory cases)
-        os.path.join('..', 'assets', 'textures', 'm256'),
-        os.path.join('..', 'assets', 'textures', 'm128'),
-        os.path.join('..', 'assets', 'textures', 'm064'),
-        os.path.join('..', 'assets', 'textures', 'm032'),
-        os.path.join('..', 'assets', 'textures', 'ClassIcons'),
-        os.path.join('..', 'assets', 'textures', 'Gray'),
-        os.path.join('..', 'assets', 'textures', 'Misc'),
-        os.path.join('..', 'assets', 'textures'),
-        
-        # Export directories
-        os.path.join('exports', 'fbx', 'textures'),
-        os.path.join('exports', 'gltf', 'textures')
-    ]
     
     # Extensions to try
     extensions = ['.tga', '.png', '.jpg', '.jpeg', '.bmp']
@@ -94,189 +216,124 @@ def get_texture_path(texture_name: str) -> Optional[str]:
         # Put the original extension first in the list to try
         extensions = [original_ext] + [ext for ext in extensions if ext != original_ext]
     
+    # Lowercase spellings don't depend on the directory, so compute them once
+    texture_name_lower = texture_name.lower()
+    base_name_lower = base_name.lower()
+    
+    # Other file names worth trying, in priority order, with the wording for
+    # the log message. Lookups in the cached listings ignore case, so each
+    # name is only needed once, in lowercase.
+    candidate_names = [(texture_name_lower, "with exact path")]
+    for ext in extensions:
+        candidate_names.append((base_name_lower + ext, "with extension"))
+        
+        # Also try with 'Character_' prefix for character textures
+        if "zbaby" in base_name_lower and not base_name_lower.startswith("character_"):
+            candidate_names.append((f"character_{base_name_lower}{ext}", "with Character_ prefix"))
+        
+        # Try without 'Character_' prefix
+        if base_name_lower.startswith("character_"):
+            candidate_names.append((base_name_lower[len("character_"):] + ext, "without Character_ prefix"))
+    
     # Try to find the texture in any of the search directories with any extension
-    for dir_path in search_dirs:
-        if not os.path.exists(dir_path):
+    for dir_path in TEXTURE_SEARCH_DIRS:
+        # Cached listing - None if the directory doesn't exist
+        dir_contents = _listdir_lower(dir_path)
+        if dir_contents is None:
             continue
             
-        # Check if the directory exists and list all files to check case-insensitive
-        try:
-            dir_contents = os.listdir(dir_path)
-            # Check if any file in the directory matches (case-insensitive)
-            for file in dir_contents:
-                if file.lower() == texture_name.lower():
-                    full_path = os.path.join(dir_path, file)
+        # Check if any file in the directory matches (case-insensitive)
+        for file_lower, file in dir_contents.items():
+            if file_lower == texture_name_lower:
+                full_path = os.path.join(dir_path, file)
+                if DEBUG:
                     print(f"Found texture with exact match (case-insensitive): {full_path}")
-                    return full_path
-                
-                # Also check for basename match with any extension
-                if os.path.splitext(file)[0].lower() == base_name.lower():
-                    full_path = os.path.join(dir_path, file)
-                    print(f"Found texture with basename match: {full_path}")
-                    return full_path
-        except Exception as e:
-            print(f"Error listing directory {dir_path}: {str(e)}")
+                return full_path
             
-        # First try the exact filename
-        full_path = os.path.join(dir_path, texture_name)
-        if os.path.exists(full_path):
-            print(f"Found texture with exact path: {full_path}")
-            return full_path
-            
-        # Try base name with different extensions
-        for ext in extensions:
-            # Try with original case
-            alt_path = os.path.join(dir_path, base_name + ext)
-            if os.path.exists(alt_path):
-                print(f"Found texture with extension: {alt_path}")
-                return alt_path
-            
-            # Try with capital first letter (Character_ZBaby_a.tga)
-            if not base_name[0].isupper() and len(base_name) > 1:
-                cap_path = os.path.join(dir_path, base_name[0].upper() + base_name[1:] + ext)
-                if os.path.exists(cap_path):
-                    print(f"Found texture with capital first letter: {cap_path}")
-                    return cap_path
-            
-            # Try with lowercase
-            alt_path_lower = os.path.join(dir_path, base_name.lower() + ext)
-            if os.path.exists(alt_path_lower) and alt_path_lower != alt_path:
-                print(f"Found texture with lowercase: {alt_path_lower}")
-                return alt_path_lower
-                
-            # Try with uppercase
-            alt_path_upper = os.path.join(dir_path, base_name.upper() + ext)
-            if os.path.exists(alt_path_upper) and alt_path_upper != alt_path:
-                print(f"Found texture with uppercase: {alt_path_upper}")
-                return alt_path_upper
-                
-            # Also try with 'Character_' prefix for character textures
-            if "zbaby" in base_name.lower() and not base_name.lower().startswith("character_"):
-                # Try both Character_ZBaby and Character_zbaby
-                variations = [
-                    f"Character_{base_name}",
-                    f"Character_{base_name.lower()}",
-                    f"character_{base_name}",
-                    f"character_{base_name.lower()}"
-                ]
-                
-                for var in variations:
-                    char_path = os.path.join(dir_path, var + ext)
-                    if os.path.exists(char_path):
-                        print(f"Found texture with Character_ prefix: {char_path}")
-                        return char_path
-                    
-            # Try without 'Character_' prefix
-            if base_name.lower().startswith("character_"):
-                no_prefix = base_name[len("Character_"):]
-                variations = [
-                    no_prefix,
-                    no_prefix.lower(),
-                    no_prefix[0].upper() + no_prefix[1:] if len(no_prefix) > 1 else no_prefix.upper()
-                ]
-                
-                for var in variations:
-                    no_prefix_path = os.path.join(dir_path, var + ext)
-                    if os.path.exists(no_prefix_path):
-                        print(f"Found texture without Character_ prefix: {no_prefix_path}")
-                        return no_prefix_path
+            # Also check for basename match with any extension
+            if os.path.splitext(file_lower)[0] == base_name_lower:
+                full_path = os.path.join(dir_path, file)
+                if DEBUG:
+                    print(f"Found texture with basename match: {full_path}")
+                return full_path
+        
+        for candidate, description in candidate_names:
+            actual = dir_contents.get(candidate)
+            if actual:
+                full_path = os.path.join(dir_path, actual)
+                if DEBUG:
+                    print(f"Found texture {description}: {full_path}")
+                return full_path
     
     # If we get here, the texture wasn't found, report error with search paths
     print(f"Warning: Texture not found for {texture_name}")
-    print(f"Searched in: {search_dirs}")
+    print(f"Searched in: {list(TEXTURE_SEARCH_DIRS)}")
     return None
 
+@functools.lru_cache(maxsize=8192)
+def _decode_name(name) -> str:
+    """Decode a name read from the .3db file (usually bytes) to str.
+
+    Names repeat a lot across materials and frames, so results are cached.
+    """
+    if isinstance(name, bytes):
+        return name.decode('utf-8', errors='ignore')
+    return str(name)
+
+@functools.lru_cache(maxsize=4096)
 def clean_material_name(name):
     """
     Clean up material names by removing bytes prefixes and other unwanted characters.
     This ensures texture paths are properly formatted.
     """
-    # Convert to string if it's bytes
-    if isinstance(name, bytes):
-        try:
-            name = name.decode('utf-8', errors='ignore')
-        except:
-            name = str(name)
-    else:
-        name = str(name)
-    
-    # Remove the bytes prefix notation if present
-    if name.startswith("b'") and name.endswith("'"):
-        name = name[2:-1]
-    
-    # Remove any remaining quotes
-    name = name.replace("'", "").replace('"', "")
-    
-    return name
+    # Remove the bytes prefix notation and any quotes in one pass
+    return _CLEAN_RE.sub("", _decode_name(name))
 
-def find_matching_textures(search_term: str, exact=False) -> list:
-    """Find textures that match a search term in assets/textures directories."""
+def find_matching_textures(search_term: str, exact=False, first_only: bool = False) -> list:
+    """Find textures that match a search term in assets/textures directories.
+
+    With first_only=True only the best match is returned (as a one-item list),
+    and scanning stops once its resolution bucket is complete.
+    """
     matching_textures = []
     
-    # Order matters - higher resolution first
-    search_directories = [
-        # High resolution textures first
-        os.path.join('assets', 'textures', 'm256'),
-        
-        # Medium resolution textures next
-        os.path.join('assets', 'textures', 'm128'),
-        
-        # Low resolution textures
-        os.path.join('assets', 'textures', 'm064'),
-        os.path.join('assets', 'textures', 'm032'),
-        
-        # Special directories
-        os.path.join('assets', 'textures', 'Gray'),
-        os.path.join('assets', 'textures', 'ClassIcons'),
-        
-        # Main texture directory last
-        os.path.join('assets', 'textures'),
-    ]
-    
     # Ensure search_term is lowercase for case-insensitive comparison
     search_term = search_term.lower()
     
-    # Process each directory in order
+    # Look the term up in the texture index instead of re-reading the directories
+    index = _get_texture_index()
+    if exact:
+        # Exact match with the filename without extension
+        candidates = index['by_stem'].get(search_term, ())
+    else:
+        # Partial match anywhere in the filename
+        candidates = (entry for entry in index['files'] if search_term in entry[0])
+    
+    if first_only:
+        # The index lists files in MATCH_SEARCH_DIRS order, which is also the
+        # resolution priority order, so the best bucket is complete as soon as
+        # a match from a lower priority bucket shows up.
+        best_bucket = []
+        best_resolution = None
+        for _, filepath, resolution in candidates:
+            if best_bucket and resolution != best_resolution:
+                break
+            best_resolution = resolution
+            best_bucket.append(filepath)
+        if not best_bucket:
+            return []
+        # Only the shortest name is needed; min keeps the first on ties, like the stable sort
+        return [min(best_bucket, key=lambda x: len(os.path.basename(x)))]
+    
+    # Group the matches by resolution category
     textures_by_resolution = {
         'm256': [],
         'm128': [],
         'm064': [],
         'other': []
     }
-    
-    for directory in search_directories:
-        if not os.path.exists(directory):
-            continue
-            
-        try:
-            for filename in os.listdir(directory):
-                if not filename.lower().endswith(('.tga', '.png', '.jpg')):
-                    continue
-                    
-                filepath = os.path.join(directory, filename)
-                filename_lower = filename.lower()
-                
-                # Check if the filename matches the search criteria
-                matches = False
-                if exact and search_term == filename_lower.split('.')[0]:
-                    # Exact match with the filename without extension
-                    matches = True
-                elif not exact and search_term in filename_lower:
-                    # Partial match anywhere in the filename
-                    matches = True
-                
-                if matches:
-                    # Determine resolution category
-                    if 'm256' in directory:
-                        textures_by_resolution['m256'].append(filepath)
-                    elif 'm128' in directory:
-                        textures_by_resolution['m128'].append(filepath)
-                    elif 'm064' in directory:
-                        textures_by_resolution['m064'].append(filepath)
-                    else:
-                        textures_by_resolution['other'].append(filepath)
-        except Exception as e:
-            print(f"Error reading directory {directory}: {str(e)}")
+    for _, filepath, resolution in candidates:
+        textures_by_resolution[resolution].append(filepath)
     
     # Combine results in order of resolution priority
     for res in ['m256', 'm128', 'm064', 'other']:
@@ -286,7 +343,15 @@ def find_matching_textures(search_term: str, exact=False) -> list:
     
     return matching_textures
 
-def analyze_material_usage(model: Model) -> Dict[int, Dict]:
+def _decode_all_material_names(model: Model) -> List[str]:
+    """Decode every material name once; the list is indexed by material index."""
+    return [_decode_name(material.name) for material in model.materials]
+
+def _decode_all_animation_names(model: Model) -> List[str]:
+    """Decode every animation name once; the list is indexed by animation index."""
+    return [_decode_name(animation.name) for animation in model.animations]
+
+def analyze_material_usage(model: Model, material_names: Optional[List[str]] = None) -> Dict[int, Dict]:
     """
     Analyze how materials are used across mesh links in the model.
     
@@ -305,43 +370,45 @@ def analyze_material_usage(model: Model) -> Dict[int, Dict]:
             "animations": set()
         }
     
-    # Scan all meshes and links
+    # Scan all meshes and links, remembering which materials each mesh uses
+    mesh_to_materials = []
     for mesh_idx, mesh in enumerate(model.meshes):
+        mesh_materials = set()
         for link_idx, link in enumerate(mesh.links):
             # Add this mesh and link to the set for this material
             if link.material < len(model.materials):
                 material_usage[link.material]["mesh_links"].add((mesh_idx, link_idx))
                 material_usage[link.material]["link_positions"].add(link_idx)
+                mesh_materials.add(link.material)
             else:
                 print(f"Warning: Mesh {mesh_idx}, Link {link_idx} references invalid material {link.material}")
+        mesh_to_materials.append(mesh_materials)
     
-    # Track which animations use which materials
+    # Track which animations use which materials. Animations reuse the same
+    # meshes across frames, so each distinct mesh only needs to be visited once.
     for anim_idx, anim in enumerate(model.animations):
-        for mesh_idx in anim.meshes:
-            if mesh_idx < len(model.meshes):
-                mesh = model.meshes[mesh_idx]
-                for link_idx, link in enumerate(mesh.links):
-                    if link.material < len(model.materials):
-                        material_usage[link.material]["animations"].add(anim_idx)
-    
-    # Print summary of material usage
-    print("\nMaterial usage summary:")
-    for mat_idx, usage in material_usage.items():
-        if mat_idx < len(model.materials):
-            mat_name = model.materials[mat_idx].name
-            if isinstance(mat_name, bytes):
-                try:
-                    mat_name = mat_name.decode('utf-8', errors='ignore')
-                except:
-                    mat_name = str(mat_name)
+        for mesh_idx in set(anim.meshes):
+            if mesh_idx < len(mesh_to_materials):
+                for mat_idx in mesh_to_materials[mesh_idx]:
+                    material_usage[mat_idx]["animations"].add(anim_idx)
+    
+    if DEBUG:
+        if material_names is None:
+            material_names = _decode_all_material_names(model)
+    
+        # Print summary of material usage
+        print("\nMaterial usage summary:")
+        for mat_idx, usage in material_usage.items():
+            if mat_idx < len(model.materials):
+                mat_name = material_names[mat_idx]
             
-            mesh_links_count = len(usage["mesh_links"])
-            link_positions = sorted(list(usage["link_positions"]))
-            anims_count = len(usage["animations"])
+                mesh_links_count = len(usage["mesh_links"])
+                link_positions = sorted(list(usage["link_positions"]))
+                anims_count = len(usage["animations"])
             
-            print(f"Material {mat_idx}: {mat_name}")
-            print(f"  Used in {mesh_links_count} mesh links at positions {link_positions}")
-            print(f"  Used by {anims_count} animations")
+                print(f"Material {mat_idx}: {mat_name}")
+                print(f"  Used in {mesh_links_count} mesh links at positions {link_positions}")
+                print(f"  Used by {anims_count} animations")
     
     return material_usage
 
@@ -353,27 +420,36 @@ def copy_textures_for_export(model: Model, export_dir: str) -> Dict[str, str]:
     # Debug information
     print(f"Copying textures to: {texture_export_dir}")
     
+    # Start from fresh directory listings for this export
+    reset_texture_cache()
+    
+    # Target paths are this prefix plus a file name; no need to join per texture
+    texture_export_prefix = texture_export_dir + os.sep
+    
     # Create a set to track processed textures to avoid duplication
     processed_textures = set()
     
+    # Copies to run once all materials are resolved: target path -> source path.
+    # Keyed by target so a later source for the same file name still wins,
+    # as it did when copies ran in order.
+    copy_jobs = {}
+    
+    # Most recent texture that was found for a material, used as a fallback
+    last_good_source_path: Optional[str] = None
+    
     # Extract model name for better material matching
-    model_name = ""
-    if model.name:
-        if isinstance(model.name, bytes):
-            try:
-                model_name = model.name.decode('utf-8', errors='ignore').lower()
-            except:
-                model_name = str(model.name).lower()
-        else:
-            model_name = str(model.name).lower()
+    model_name = _decode_name(model.name).lower() if model.name else ""
     
     # Remove file extension and path from model name
     model_basename = os.path.splitext(os.path.basename(model_name))[0].lower()
     print(f"Using model basename for texture matching: {model_basename}")
     
+    # Decode material names once for the logging and lookups below
+    material_names = _decode_all_material_names(model)
+    
     # Analyze how materials are used across the model
     # This gives us information about which link positions typically use which materials
-    material_usage = analyze_material_usage(model)
+    material_usage = analyze_material_usage(model, material_names)
     
     # Create a mapping from link positions to typical material usage
     # This helps us make smarter decisions for more complex models
@@ -385,27 +461,23 @@ def copy_textures_for_export(model: Model, export_dir: str) -> Dict[str, str]:
                     link_position_map[link_pos] = []
                 link_position_map[link_pos].append(mat_idx)
     
-    # Print link position mapping for debugging
-    print("\nLink position to material mapping:")
-    for link_pos, mat_indices in sorted(link_position_map.items()):
-        material_names = []
-        for idx in mat_indices[:3]:  # Limit to first 3 materials per position
-            mat_name = model.materials[idx].name
-            if isinstance(mat_name, bytes):
-                try:
-                    mat_name = mat_name.decode('utf-8', errors='ignore')
-                except:
-                    mat_name = str(mat_name)
-            material_names.append(mat_name)
+    if DEBUG:
+        # Print link position mapping for debugging
+        print("\nLink position to material mapping:")
+        for link_pos, mat_indices in sorted(link_position_map.items()):
+            position_names = []
+            for idx in mat_indices[:3]:  # Limit to first 3 materials per position
+                position_names.append(material_names[idx])
         
-        print(f"  Link position {link_pos}: {', '.join(material_names)}{' and more...' if len(mat_indices) > 3 else ''}")
+            print(f"  Link position {link_pos}: {', '.join(position_names)}{' and more...' if len(mat_indices) > 3 else ''}")
     
     # Now we'll use both material usage and link position information to make smarter texture assignments
     
     texture_map = {}
     for i, material in enumerate(model.materials):
         # Debug the material info
-        print(f"Processing material {i}: {material.name}, path: {material.path}")
+        if DEBUG:
+            print(f"Processing material {i}: {material.name}, path: {material.path}")
         
         # Get texture name from material path
         texture_name = extract_texture_filename(material.path)
@@ -415,14 +487,7 @@ def copy_textures_for_export(model: Model, export_dir: str) -> Dict[str, str]:
         material_name_lower = material_name_clean.lower()
         
         # Generate a material name for the map (keep original for the key)
-        material_name_str = ""
-        if isinstance(material.name, bytes):
-            try:
-                material_name_str = material.name.decode('utf-8', errors='ignore')
-            except Exception:
-                material_name_str = str(material.name)
-        else:
-            material_name_str = str(material.name)
+        material_name_str = material_names[i]
         
         # Try to find textures based on material and model information
         # This is a prioritized list of search strategies
@@ -431,116 +496,214 @@ def copy_textures_for_export(model: Model, export_dir: str) -> Dict[str, str]:
         # Strategy 1: Look for the exact texture mentioned in the material path
         if texture_name:
             direct_path = get_texture_path(texture_name)
-            if direct_path and os.path.exists(direct_path):
+            # get_texture_path only returns files from a fresh directory listing
+            if direct_path:
                 source_path = direct_path
-                print(f"Found texture referenced by material path: {source_path}")
+                if DEBUG:
+                    print(f"Found texture referenced by material path: {source_path}")
         
         # Strategy 2: Try to find exact match for the material name
         if not source_path:
             # First try to find an exact match for the material name
-            exact_matches = find_matching_textures(material_name_lower, exact=True)
+            exact_matches = find_matching_textures(material_name_lower, exact=True, first_only=True)
             if exact_matches:
                 source_path = exact_matches[0]
                 # If this is a Gray texture, but we can find a higher-res version in other directories
                 if 'Gray' in source_path or 'm064' in source_path or 'm032' in source_path:
                     # Try to find a better version
-                    higher_res_matches = find_matching_textures(material_name_lower, exact=True)
+                    higher_res_matches = find_matching_textures(material_name_lower, exact=True, first_only=True)
                     if higher_res_matches and higher_res_matches[0] != source_path:
                         # Found a potentially higher resolution version
                         if ('m256' in higher_res_matches[0] or 'm128' in higher_res_matches[0]):
                             source_path = higher_res_matches[0]
-                            print(f"Found higher quality exact match: {source_path}")
+                            if DEBUG:
+                                print(f"Found higher quality exact match: {source_path}")
                         
-                print(f"Found exact match for material name: {source_path}")
+                if DEBUG:
+                    print(f"Found exact match for material name: {source_path}")
         
         # Strategy 3: Try to find textures that match both model name and material name 
         if not source_path and model_basename:
             combined_search = f"{model_basename}_{material_name_lower}"
-            matching_textures = find_matching_textures(combined_search)
+            matching_textures = find_matching_textures(combined_search, first_only=True)
             if matching_textures:
                 source_path = matching_textures[0]
-                print(f"Found texture matching model+material: {source_path}")
+                if DEBUG:
+                    print(f"Found texture matching model+material: {source_path}")
         
         # Strategy 4: Try character textures with model name
         if not source_path and model_basename:
             character_search = f"character_{model_basename}"
-            matching_textures = find_matching_textures(character_search)
+            matching_textures = find_matching_textures(character_search, first_only=True)
             if matching_textures:
                 source_path = matching_textures[0]
-                print(f"Found character texture with model name: {source_path}")
+                if DEBUG:
+                    print(f"Found character texture with model name: {source_path}")
 
         # Strategy 5: Try for material name in textures
         if not source_path:
-            partial_matches = find_matching_textures(material_name_lower)
+            partial_matches = find_matching_textures(material_name_lower, first_only=True)
             if partial_matches:
                 source_path = partial_matches[0]
-                print(f"Found partial match for material name: {source_path}")
+                if DEBUG:
+                    print(f"Found partial match for material name: {source_path}")
                 
         # Strategy 6: As a last resort, try the model name alone
         if not source_path and model_basename:
-            model_matches = find_matching_textures(model_basename)
+            model_matches = find_matching_textures(model_basename, first_only=True)
             if model_matches:
                 source_path = model_matches[0]
-                print(f"Found texture matching model name: {source_path}")
+                if DEBUG:
+                    print(f"Found texture matching model name: {source_path}")
                 
         # If we still don't have a texture but we have a path, log it clearly
         if not source_path and texture_name:
             print(f"WARNING: Could not find texture for material {material.name} with path {texture_name}")
             print(f"This material is used in {len(material_usage[i])} mesh links")
             
-            # Try using another texture from the same model as a fallback
-            for other_mat_idx, other_mat in enumerate(model.materials):
-                if other_mat_idx != i and other_mat_idx in texture_map:
-                    source_path = texture_map[other_mat.name].replace('textures/', '')
-                    source_path = os.path.join('textures', source_path)
-                    print(f"Using another material's texture as fallback: {source_path}")
-                    break
+            # The material's own name comes first; another material's
+            # texture is only a last resort
+            source_path = get_texture_path(material_name_clean) if material.name else None
+            if source_path:
+                print(f"Found texture by material name: {source_path}")
+            elif last_good_source_path:
+                # Try using another texture from the same model as a fallback
+                source_path = last_good_source_path
+                print(f"Using another material's texture as fallback: {source_path}")
         
         if source_path and os.path.exists(source_path):
             # Use cleaned material name for the target filename
             target_filename = os.path.basename(source_path)
-            target_path = os.path.join(texture_export_dir, target_filename)
+            target_path = texture_export_prefix + target_filename
             
             # Check if we've already processed this texture to avoid duplicates
             if source_path not in processed_textures:
                 print(f"Copying texture: {source_path} -> {target_path}")
-                shutil.copy2(source_path, target_path)
+                copy_jobs[target_path] = source_path
                 processed_textures.add(source_path)
             else:
-                print(f"Skipping already copied texture: {source_path}")
+                if DEBUG:
+                    print(f"Skipping already copied texture: {source_path}")
+            
+            last_good_source_path = source_path
             
             # Store path that will be used for material referencing
             texture_map[material.name] = os.path.join('textures', target_filename)
-            print(f"Added to texture map: {material.name} -> {texture_map[material.name]}")
+            if DEBUG:
+                print(f"Added to texture map: {material.name} -> {texture_map[material.name]}")
         else:
             print(f"Warning: Texture not found for material {material.name}: {texture_name}")
             
             # Try search by material name if texture name search failed
             if not source_path and material.name:
                 alt_source_path = get_texture_path(material_name_clean)
-                if alt_source_path and os.path.exists(alt_source_path):
+                if alt_source_path:
                     target_filename = os.path.basename(alt_source_path)
-                    target_path = os.path.join(texture_export_dir, target_filename)
+                    target_path = texture_export_prefix + target_filename
                     
                     # Check if we've already processed this texture
                     if alt_source_path not in processed_textures:
                         print(f"Found texture by material name: {alt_source_path} -> {target_path}")
-                        shutil.copy2(alt_source_path, target_path)
+                        copy_jobs[target_path] = alt_source_path
                         processed_textures.add(alt_source_path)
                     else:
-                        print(f"Skipping already copied texture by material name: {alt_source_path}")
+                        if DEBUG:
+                            print(f"Skipping already copied texture by material name: {alt_source_path}")
                     
                     texture_map[material.name] = os.path.join('textures', target_filename)
     
+    # Copying is I/O bound, so a few threads overlap it well. texture_map
+    # doesn't depend on the copies, only the files on disk do. copyfile skips
+    # the metadata copy2 would preserve, which exported textures don't need.
+    if copy_jobs:
+        with ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) * 2)) as executor:
+            list(executor.map(shutil.copyfile, copy_jobs.values(), copy_jobs.keys()))
+    
     return texture_map
 
-def build_vertices_array(triangles: List[int], points: List[Tuple[float, float, float]]) -> List[Tuple[float, float, float]]:
-    """Build an array of vertices from triangles and points."""
-    vertices = [points[index] for index in triangles]
-    return vertices
+def build_vertices_array(triangles: List[int], points: List[Tuple[float, float, float]]) -> np.ndarray:
+    """Build an (N, 3) float32 array of vertices from triangles and points."""
+    return np.asarray(points, dtype=np.float32)[np.asarray(triangles, dtype=np.int32)]
 
-def export_to_gltf(model: Model, output_path: str = 'exports/gltf/model.gltf'):
-    """Export the model to glTF format with animations."""
+def _encode_link(vertices: np.ndarray, uvs: np.ndarray, triangles, quantize_positions: bool = False):
+    """
+    Pack one link's positions, UVs and indices into little-endian glTF bytes.
+    
+    Returns (vertex count, position bytes, position min, position max, node
+    transform or None, UV bytes, UV min, UV max, index count, index bytes,
+    index component type).
+    """
+    node_transform = None
+    if quantize_positions:
+        # Map each axis onto 0..65535 and let the node transform
+        # undo it. Flat axes keep a scale of 1 so the node matrix
+        # stays invertible.
+        offset = vertices.min(axis=0)
+        extent = vertices.max(axis=0) - offset
+        extent[extent == 0] = 1.0
+        quantized = np.rint((vertices - offset) / extent * 65535.0)
+        # Pad to 4 components so every vertex starts on a 4-byte boundary
+        positions = np.zeros((len(vertices), 4), dtype='<u2')
+        positions[:, :3] = quantized
+        node_transform = (offset.tolist(), extent.tolist())
+        
+        # Normalized accessors give their bounds as normalized values
+        mins = (positions[:, :3].min(axis=0) / 65535.0).tolist()
+        maxs = (positions[:, :3].max(axis=0) / 65535.0).tolist()
+    else:
+        # glTF buffers are little-endian regardless of the host
+        positions = vertices.astype('<f4')
+        
+        # Bounds come from the float32 values actually stored, which
+        # is what glTF requires the accessor min/max to match
+        mins = positions.min(axis=0).tolist()
+        maxs = positions.max(axis=0).tolist()
+    
+    # 16-bit indices whenever they fit (65535 is reserved for primitive restart)
+    indices = np.asarray(triangles, dtype=np.int64)
+    if indices.max() < 65535:
+        index_bytes = indices.astype('<u2').tobytes()
+        index_component_type = ComponentType.UNSIGNED_SHORT.value
+    else:
+        index_bytes = indices.astype('<u4').tobytes()
+        index_component_type = ComponentType.UNSIGNED_INT.value
+    
+    return (len(vertices), positions.tobytes(), mins, maxs, node_transform,
+            uvs.tobytes(), uvs.min(axis=0).tolist(), uvs.max(axis=0).tolist(),
+            len(indices), index_bytes, index_component_type)
+
+def write_compressed_buffer(data: bytes, path: str) -> str:
+    """Write a compressed copy of a glTF buffer next to path and return its filename."""
+    if blosc is not None:
+        # typesize=4 lets the shuffle filter group the bytes of floats and uint32s
+        compressed_path = path + '.blosc'
+        compressed = blosc.compress(bytes(data), typesize=4, cname='lz4', clevel=5)
+    else:
+        compressed_path = path + '.gz'
+        compressed = gzip.compress(bytes(data), compresslevel=6)
+    
+    with open(compressed_path, 'wb') as f:
+        f.write(compressed)
+    
+    print(f'Compressed buffer: {len(data)} -> {len(compressed)} bytes ({compressed_path})')
+    return compressed_path
+
+def export_to_gltf(model: Model, output_path: str = 'exports/gltf/model.gltf', quantize_positions: bool = False,
+                   compress_buffers: bool = False):
+    """
+    Export the model to glTF format with animations.
+    
+    If output_path ends with .glb, a single binary glTF file is written with
+    the vertex and index data embedded instead of separate .bin files.
+    
+    With quantize_positions, positions are stored as normalized 16-bit values
+    (KHR_mesh_quantization) and each node gets the translation/scale that maps
+    them back to the original geometry.
+    
+    With compress_buffers, a compressed copy of the vertex/index buffer is
+    also written as a sidecar (Blosc/LZ4 if installed, gzip otherwise). The
+    glTF itself still references the uncompressed data.
+    """
     # Create export directory if it doesn't exist
     export_dir = os.path.dirname(output_path)
     os.makedirs(export_dir, exist_ok=True)
@@ -556,17 +719,15 @@ def export_to_gltf(model: Model, output_path: str = 'exports/gltf/model.gltf'):
     animation_samplers = []
     materials = []  # We'll store materials here
     
+    # Decode material and animation names once; both loops below reuse them
+    material_names = _decode_all_material_names(model)
+    animation_names = _decode_all_animation_names(model)
+    
+    # Material part of the node names, cleaned once per material
+    node_material_names = [name.replace("b'", "").replace("'", "").strip() for name in material_names]
+    
     # Create a material for each material in the model
-    for i, material in enumerate(model.materials):
-        material_name = ""
-        if isinstance(material.name, bytes):
-            try:
-                material_name = material.name.decode('utf-8', errors='ignore')
-            except:
-                material_name = str(material.name)
-        else:
-            material_name = str(material.name)
-        
+    for i, material_name in enumerate(material_names):
         # Create a material with extras for the original index
         materials.append({
             "name": f"material_{i:02d}_{material_name}",
@@ -576,47 +737,30 @@ def export_to_gltf(model: Model, output_path: str = 'exports/gltf/model.gltf'):
             }
         })
 
-    vertex_byte_array = bytearray()
-    index_byte_array = bytearray()
-    
     # Process all animations
-    # Create a dictionary to track animations with the same names
-    anim_name_counts = {}
-    for animation in model.animations:
-        anim_name = animation.name
-        if isinstance(anim_name, bytes):
-            try:
-                anim_name = anim_name.decode('utf-8', errors='ignore')
-            except:
-                anim_name = str(anim_name)
-        
-        if anim_name in anim_name_counts:
-            anim_name_counts[anim_name] += 1
-        else:
-            anim_name_counts[anim_name] = 1
+    # Count animations with the same names
+    anim_name_counts = Counter(animation_names)
     
     # Output the list of animations with the same names for debugging
     duplicate_names = [name for name, count in anim_name_counts.items() if count > 1]
     if duplicate_names:
         print(f"WARNING: Found duplicate animation names: {duplicate_names}")
     
-    # Use a counter to create unique names
-    anim_name_indexer = {}
+    # Transformed points per points_data entry, shared by every frame that uses it
+    points_cache: Dict[int, np.ndarray] = {}
+    
+    # Data to encode per distinct (points, triangles, texture_coordinates). Frames
+    # that reuse the same data share one set of accessors.
+    encode_jobs: Dict[Tuple[int, int, int], tuple] = {}
+    
+    # (anim_idx, frame_idx, link_idx, material, link key) of every exported link
+    exported_links = []
     
     # Process all animations
     for anim_idx, animation in enumerate(model.animations):
-        # Update the counter for the current animation name
-        anim_name = animation.name
-        if isinstance(anim_name, bytes):
-            try:
-                anim_name = anim_name.decode('utf-8', errors='ignore')
-            except:
-                anim_name = str(anim_name)
-                
-        if anim_name not in anim_name_indexer:
-            anim_name_indexer[anim_name] = 0
-        else:
-            anim_name_indexer[anim_name] += 1
+        # Node names stay unique through anim_idx, even for duplicate names
+        anim_name = animation_names[anim_idx]
+        
         # For each mesh in the animation
         for frame_idx, mesh_idx in enumerate(animation.meshes):
             if mesh_idx >= len(model.meshes):
@@ -641,7 +785,13 @@ def export_to_gltf(model: Model, output_path: str = 'exports/gltf/model.gltf'):
                         print(f"Warning: Empty triangles data in {animation.name}_frame{frame_idx}_link{link_idx}")
                         continue
                     
-                    vertices = [transform_point(p) for p in points]
+                    # Same transform as transform_point, applied to the whole
+                    # link at once. Kept in float64 so the packed float32 values
+                    # match the per-point version exactly.
+                    vertices = points_cache.get(mesh_link.points)
+                    if vertices is None:
+                        vertices = (np.asarray(points, dtype=np.float64).reshape(-1, 3) - 0.5) * 100.0
+                        points_cache[mesh_link.points] = vertices
                     
                     # Проверяем соответствие UV координат и вершин
                     if len(texture_coordinates) != len(vertices):
@@ -652,10 +802,8 @@ def export_to_gltf(model: Model, output_path: str = 'exports/gltf/model.gltf'):
                         else:
                             texture_coordinates = texture_coordinates[:len(vertices)]
                     
-                    vertex_data_start = len(vertex_byte_array)
-                    
                     # Финальная проверка на пустые данные
-                    if not vertices:
+                    if len(vertices) == 0:
                         print(f"Warning: Empty mesh found in {animation.name}_frame{frame_idx}_link{link_idx}")
                         # Пропускаем создание этого меша
                         continue
@@ -663,140 +811,182 @@ def export_to_gltf(model: Model, output_path: str = 'exports/gltf/model.gltf'):
                     print(f"Error processing mesh: {animation.name}_frame{frame_idx}_link{link_idx}: {str(e)}")
                     continue
                 
-                for vertex in vertices:
-                    for value in vertex:
-                        vertex_byte_array.extend(struct.pack('f', value))
-
-                mins = [min([operator.itemgetter(i)(vertex) for vertex in vertices]) for i in range(3)]
-                maxs = [max([operator.itemgetter(i)(vertex) for vertex in vertices]) for i in range(3)]
-
-                texture_coords_start = len(vertex_byte_array)
-                for t in texture_coordinates:
-                    for value in t:
-                        vertex_byte_array.extend(struct.pack('f', value))
-
-                indices_start = len(index_byte_array)
-                for index in triangles:
-                    index_byte_array.extend(struct.pack('I', index))
-
-                position_index = len(accessors)
-                accessors.append(Accessor(
-                    bufferView=0, 
-                    byteOffset=vertex_data_start, 
-                    componentType=ComponentType.FLOAT.value, 
-                    count=len(vertices),
-                    type=AccessorType.VEC3.value, 
-                    min=mins, 
-                    max=maxs
-                ))
-
-                texture_coords_index = len(accessors)
-                accessors.append(Accessor(
-                    bufferView=0, 
-                    byteOffset=texture_coords_start, 
-                    componentType=ComponentType.FLOAT.value, 
-                    count=len(texture_coordinates),
-                    type=AccessorType.VEC2.value
-                ))
-
-                indices_index = len(accessors)
-                accessors.append(Accessor(
-                    bufferView=1, 
-                    byteOffset=indices_start, 
-                    componentType=ComponentType.UNSIGNED_INT.value, 
-                    count=len(triangles),
-                    type=AccessorType.SCALAR.value
-                ))
-
-                # Get material index for this link
-                material_index = mesh_link.material
-                if material_index >= len(model.materials):
-                    print(f"Warning: Invalid material index {material_index} in {animation.name}_frame{frame_idx}_link{link_idx}")
-                    material_index = 0  # Fallback to first material
-                
-                mesh_index = len(meshes)
-                meshes.append(Mesh(primitives=[
-                    Primitive(
-                        attributes=Attributes(
-                            POSITION=position_index, 
-                            TEXCOORD_0=texture_coords_index
-                        ), 
-                        indices=indices_index,
-                        material=material_index  # Add material reference here
-                    )
-                ]))
-                
-                # Get material name for this material index
-                material_name = ""
-                if material_index < len(model.materials):
-                    material = model.materials[material_index]
-                    if isinstance(material.name, bytes):
-                        try:
-                            material_name = material.name.decode('utf-8', errors='ignore')
-                        except:
-                            material_name = str(material.name)
-                    else:
-                        material_name = str(material.name)
-                    
-                    # Clean up the material name
-                    material_name = material_name.replace("b'", "").replace("'", "").strip()
-                
-                # Create a node with both animation structure and material name
-                node_index = len(nodes)
-                # Combine animation structure with material name to preserve both
-                # Format: animation_name_frameXX_linkYY_MaterialName
-                # This preserves the animation structure while also including material info
-                anim_name = animation.name
-                if isinstance(anim_name, bytes):
-                    try:
-                        anim_name = anim_name.decode('utf-8', errors='ignore')
-                    except:
-                        anim_name = str(anim_name)
-                
-                # Сохраняем структуру anim_name/frame_XX/material_name
-                # Добавляем индекс анимации к имени, чтобы избежать дублирования
-                node_name = f"{anim_name}_{anim_idx:02d}_frame{frame_idx:02d}_{material_name}"
-                
-                
-                # Clean up the name to avoid any problematic characters
-                node_name = node_name.replace("b'", "").replace("'", "").strip()
-                nodes.append(Node(mesh=mesh_index, name=node_name))
+                link_key = (mesh_link.points, mesh_link.triangles, mesh_link.texture_coordinates)
+                if link_key not in encode_jobs:
+                    # Take the UVs as they are now; the padding above extends the
+                    # shared list in place when a later link has more points
+                    uvs = np.asarray(texture_coordinates, dtype='<f4').reshape(-1, 2)
+                    encode_jobs[link_key] = (vertices, uvs, triangles)
+                exported_links.append((anim_idx, frame_idx, link_idx, mesh_link.material, link_key))
+    
+    # Encode every distinct link. Links are independent, so big models spread
+    # them over worker processes; small ones stay in this process, where
+    # starting the workers would cost more than it saves.
+    jobs = list(encode_jobs.values())
+    encode = functools.partial(_encode_link, quantize_positions=quantize_positions)
+    encoded = None
+    if len(jobs) >= PARALLEL_ENCODE_MIN_LINKS:
+        try:
+            with ProcessPoolExecutor() as executor:
+                encoded = list(executor.map(encode, *zip(*jobs), chunksize=64))
+        except Exception as e:
+            # e.g. no usable multiprocessing when embedded in another application
+            print(f"Warning: Parallel encoding failed, encoding links serially: {e}")
+    if encoded is None:
+        encoded = [encode(*job) for job in jobs]
+    
+    # Lay the encoded links out one after another and point accessors at them
+    # (position, texcoord, index accessors, node transform) per link key
+    accessor_cache: Dict[Tuple[int, int, int], tuple] = {}
+    vertex_parts = []
+    vertex_offset = 0
+    index_parts = []
+    index_offset = 0
+    for link_key, (vertex_count, position_bytes, mins, maxs, node_transform, uv_bytes, uv_mins, uv_maxs,
+                   index_count, index_bytes, index_component_type) in zip(encode_jobs, encoded):
+        vertex_data_start = vertex_offset
+        texture_coords_start = vertex_offset + len(position_bytes)
+        vertex_parts.append(position_bytes)
+        vertex_parts.append(uv_bytes)
+        vertex_offset = texture_coords_start + len(uv_bytes)
+        
+        # Keep every index accessor 4-byte aligned, whatever its component size
+        indices_start = index_offset
+        index_parts.append(index_bytes)
+        index_parts.append(bytes(-len(index_bytes) & 3))
+        index_offset += (len(index_bytes) + 3) & ~3
+
+        position_index = len(accessors)
+        accessors.append(Accessor(
+            bufferView=0, 
+            byteOffset=vertex_data_start, 
+            componentType=ComponentType.UNSIGNED_SHORT.value if quantize_positions else ComponentType.FLOAT.value, 
+            normalized=True if quantize_positions else None,
+            count=vertex_count,
+            type=AccessorType.VEC3.value, 
+            min=mins, 
+            max=maxs
+        ))
+
+        texture_coords_index = len(accessors)
+        accessors.append(Accessor(
+            bufferView=0, 
+            byteOffset=texture_coords_start, 
+            componentType=ComponentType.FLOAT.value, 
+            count=vertex_count,
+            type=AccessorType.VEC2.value,
+            min=uv_mins,
+            max=uv_maxs
+        ))
+
+        indices_index = len(accessors)
+        accessors.append(Accessor(
+            bufferView=1, 
+            byteOffset=indices_start, 
+            componentType=index_component_type, 
+            count=index_count,
+            type=AccessorType.SCALAR.value
+        ))
+        
+        accessor_cache[link_key] = (position_index, texture_coords_index, indices_index, node_transform)
     
-    # Create the glTF model
-    vertices_bin_path = 'vertices.bin'
-    indices_bin_path = 'indices.bin'
+    vertex_byte_array = b"".join(vertex_parts)
+    index_byte_array = b"".join(index_parts)
     
+    # One mesh and node per exported link, in the original order
+    for anim_idx, frame_idx, link_idx, material_index, link_key in exported_links:
+        anim_name = animation_names[anim_idx]
+        position_index, texture_coords_index, indices_index, node_transform = accessor_cache[link_key]
+        
+        # Get material index for this link
+        if material_index >= len(model.materials):
+            print(f"Warning: Invalid material index {material_index} in {model.animations[anim_idx].name}_frame{frame_idx}_link{link_idx}")
+            material_index = 0  # Fallback to first material
+        
+        mesh_index = len(meshes)
+        meshes.append(Mesh(primitives=[
+            Primitive(
+                attributes=Attributes(
+                    POSITION=position_index, 
+                    TEXCOORD_0=texture_coords_index
+                ), 
+                indices=indices_index,
+                material=material_index  # Add material reference here
+            )
+        ]))
+        
+        # Get material name for this material index
+        material_name = ""
+        if material_index < len(node_material_names):
+            material_name = node_material_names[material_index]
+        
+        # Create a node with both animation structure and material name
+        node_index = len(nodes)
+        # Combine animation structure with material name to preserve both
+        # Format: animation_name_frameXX_linkYY_MaterialName
+        # This preserves the animation structure while also including material info
+        # Сохраняем структуру anim_name/frame_XX/material_name
+        # Добавляем индекс анимации к имени, чтобы избежать дублирования
+        node_name = f"{anim_name}_{anim_idx:02d}_frame{frame_idx:02d}_{material_name}"
+        
+        
+        # Clean up the name to avoid any problematic characters. Decoded
+        # names rarely contain quotes, so only rebuild the string when needed.
+        if "'" in node_name:
+            node_name = node_name.replace("b'", "").replace("'", "")
+        node_name = node_name.strip()
+        if node_transform is not None:
+            translation, scale = node_transform
+            nodes.append(Node(mesh=mesh_index, name=node_name, translation=translation, scale=scale))
+        else:
+            nodes.append(Node(mesh=mesh_index, name=node_name))
+    
+    # Vertex and index data share one buffer; the index data starts on a
+    # 4-byte boundary after the vertex data
+    index_view_offset = (len(vertex_byte_array) + 3) & ~3
+    buffer_data = vertex_byte_array + bytes(index_view_offset - len(vertex_byte_array)) + index_byte_array
+    
+    # Name the buffer after the model so several models can share a directory
+    bin_path = os.path.splitext(os.path.basename(output_path))[0] + '.bin'
+    
+    # Create the glTF model
     gltf_model = GLTFModel(
         asset=Asset(version='2.0'),
         scenes=[Scene(nodes=[i for i in range(len(nodes))])],
         nodes=nodes,
         buffers=[
-            Buffer(byteLength=len(vertex_byte_array), uri=vertices_bin_path), 
-            Buffer(byteLength=len(index_byte_array), uri=indices_bin_path)
+            Buffer(byteLength=len(buffer_data), uri=bin_path)
         ],
         bufferViews=[
-            BufferView(buffer=0, byteOffset=0, byteLength=len(vertex_byte_array), target=BufferTarget.ARRAY_BUFFER.value),
-            BufferView(buffer=1, byteOffset=0, byteLength=len(index_byte_array), target=BufferTarget.ELEMENT_ARRAY_BUFFER.value)
+            # Padded quantized positions and float UVs are both 8 bytes per vertex
+            BufferView(buffer=0, byteOffset=0, byteLength=len(vertex_byte_array), byteStride=8 if quantize_positions else None, target=BufferTarget.ARRAY_BUFFER.value),
+            BufferView(buffer=0, byteOffset=index_view_offset, byteLength=len(index_byte_array), target=BufferTarget.ELEMENT_ARRAY_BUFFER.value)
         ],
         accessors=accessors,
         meshes=meshes,
-        materials=materials  # Add materials to the model
+        materials=materials,  # Add materials to the model
+        extensionsUsed=['KHR_mesh_quantization'] if quantize_positions else None,
+        extensionsRequired=['KHR_mesh_quantization'] if quantize_positions else None
     )
 
     # Create the glTF object with resources
-    vertices_bin_full_path = os.path.join(export_dir, vertices_bin_path)
-    indices_bin_full_path = os.path.join(export_dir, indices_bin_path)
-    
     gltf = GLTF(
         model=gltf_model, 
         resources=[
-            FileResource(vertices_bin_path, data=vertex_byte_array),
-            FileResource(indices_bin_path, data=index_byte_array)
+            FileResource(bin_path, data=buffer_data)
         ]
     )
     
+    if compress_buffers:
+        write_compressed_buffer(buffer_data, os.path.join(export_dir, bin_path))
+    
+    # Binary glTF: embed the buffer in the .glb and write one file
+    if output_path.lower().endswith('.glb'):
+        gltf.export_glb(output_path, embed_buffer_resources=True, save_file_resources=False)
+        print(f'Exported binary glTF model to {output_path}')
+        return
+    
     # Export the glTF file
     gltf.export(output_path)
     print(f'Exported glTF model to {output_path}')
-    print(f'Exported vertex data to {os.path.join(export_dir, vertices_bin_path)}')
-    print(f'Exported index data to {os.path.join(export_dir, indices_bin_path)}')
+    print(f'Exported vertex and index data to {os.path.join(export_dir, bin_path)}')
@@ -1,3 +1,5 @@
+import functools
+import io
 import os
 import shutil
 import struct
@@ -6,6 +8,15 @@ from typing import List, Dict, Tuple, Optional
 from PIL import Image
 from lib.parse_3db import Model, Animation, Mesh, MeshLink
 
+# Directories and extensions searched for textures, in order
+TEXTURE_SEARCH_DIRS = [
+    os.path.join('assets', 'textures', 'm256'),
+    os.path.join('assets', 'textures'),
+    os.path.join('..', 'assets', 'textures', 'm256'),
+    os.path.join('..', 'assets', 'textures')
+]
+TEXTURE_EXTENSIONS = ['.tga', '.png', '.jpg', '.jpeg']
+
 def transform_point(p: Tuple[float, float, float]) -> Tuple[float, float, float]:
     """Transform a point from the .3db coordinate system to a more standard one."""
     scale = 100
@@ -33,6 +44,38 @@ def extract_texture_filename(texture_path):
     
     return ""
 
+@functools.lru_cache(maxsize=None)
+def _texture_dir_listing(dir_path):
+    """Map lowercase file names to real names for one directory, scanned once."""
+    try:
+        with os.scandir(dir_path) as it:
+            return {entry.name.lower(): entry.name for entry in it if entry.is_file()}
+    except OSError:
+        return {}
+
+def _find_texture_file(dir_path, filename):
+    """Look a file up in the cached listing of its directory (case-insensitive)."""
+    head, tail = os.path.split(os.path.join(dir_path, filename))
+    actual = _texture_dir_listing(head).get(tail.lower())
+    return os.path.join(head, actual) if actual else None
+
+def copy_if_changed(source_path, target_path):
+    """
+    Copy source_path to target_path unless the target already has the same size
+    and is at least as new. Returns True if the file was copied.
+    """
+    source_stat = os.stat(source_path)
+    try:
+        target_stat = os.stat(target_path)
+    except FileNotFoundError:
+        pass
+    else:
+        if target_stat.st_size == source_stat.st_size and target_stat.st_mtime >= source_stat.st_mtime:
+            return False
+    
+    shutil.copyfile(source_path, target_path)
+    return True
+
 def get_texture_path(texture_name):
     """Get the full path to a texture file."""
     # Handle bytes paths
@@ -48,28 +91,17 @@ def get_texture_path(texture_name):
     # Try to find the texture file with different extensions
     base_name = os.path.splitext(filename)[0]
     
-    # Check in the specified texture directories
-    search_dirs = [
-        os.path.join('assets', 'textures', 'm256'),
-        os.path.join('assets', 'textures'),
-        os.path.join('..', 'assets', 'textures', 'm256'),
-        os.path.join('..', 'assets', 'textures')
-    ]
-    
-    # Try different extensions
-    extensions = ['.tga', '.png', '.jpg', '.jpeg']
-    
     # First try original filename
-    for search_dir in search_dirs:
-        path = os.path.join(search_dir, filename)
-        if os.path.exists(path):
+    for search_dir in TEXTURE_SEARCH_DIRS:
+        path = _find_texture_file(search_dir, filename)
+        if path:
             return path
             
     # Then try with different extensions
-    for search_dir in search_dirs:
-        for ext in extensions:
-            path = os.path.join(search_dir, base_name + ext)
-            if os.path.exists(path):
+    for search_dir in TEXTURE_SEARCH_DIRS:
+        for ext in TEXTURE_EXTENSIONS:
+            path = _find_texture_file(search_dir, base_name + ext)
+            if path:
                 return path
     
     # If texture not found, return None
@@ -81,6 +113,13 @@ def copy_textures_for_export(model, export_dir):
     texture_export_dir = os.path.join(export_dir, 'textures')
     os.makedirs(texture_export_dir, exist_ok=True)
     
+    # Each texture directory is scanned once per export instead of probing
+    # every name and extension with os.path.exists
+    _texture_dir_listing.cache_clear()
+    
+    # Source textures already copied; several materials often share one
+    copied = set()
+    
     texture_map = {}
     for i, material in enumerate(model.materials):
         # Improved filename extraction
@@ -94,50 +133,53 @@ def copy_textures_for_export(model, export_dir):
         base_name = os.path.splitext(texture_name)[0]
         source_path = None
         
-        # Check different folders and extensions
-        search_dirs = [
-            os.path.join('assets', 'textures', 'm256'),
-            os.path.join('assets', 'textures'),
-            os.path.join('..', 'assets', 'textures', 'm256'),
-            os.path.join('..', 'assets', 'textures')
-        ]
-        extensions = ['.tga', '.png', '.jpg', '.jpeg']
-        
         # First try with the original name
-        for dir_path in search_dirs:
-            path = os.path.join(dir_path, texture_name)
-            if os.path.exists(path):
-                source_path = path
+        for dir_path in TEXTURE_SEARCH_DIRS:
+            source_path = _find_texture_file(dir_path, texture_name)
+            if source_path:
                 break
         
         # If not found, try with different extensions
         if not source_path:
-            for dir_path in search_dirs:
-                for ext in extensions:
-                    path = os.path.join(dir_path, base_name + ext)
-                    if os.path.exists(path):
-                        source_path = path
+            for dir_path in TEXTURE_SEARCH_DIRS:
+                for ext in TEXTURE_EXTENSIONS:
+                    source_path = _find_texture_file(dir_path, base_name + ext)
+                    if source_path:
                         break
                 if source_path:
                     break
         
-        if source_path and os.path.exists(source_path):
+        if source_path:
             # Create unique name in target
             material_name = material.name.decode('utf-8', errors='replace') if isinstance(material.name, bytes) else material.name
             # Use only original filename to prevent issues with duplicate names
             target_filename = os.path.basename(source_path)
             target_path = os.path.join(texture_export_dir, target_filename)
             
-            # Copy file and add to map
-            print(f"Copying texture: {source_path} -> {target_path}")
-            shutil.copy2(source_path, target_path)
+            # Copy file (contents only, metadata isn't needed) and add to map.
+            # A target left by an earlier export of the same texture is kept.
+            if source_path not in copied:
+                if copy_if_changed(source_path, target_path):
+                    print(f"Copying texture: {source_path} -> {target_path}")
+                copied.add(source_path)
             texture_map[material_name] = os.path.join('textures', target_filename)
         else:
             print(f"Warning: Texture not found for material {material.name}: {texture_name}")
-            print(f"Searched in: {search_dirs}")
+            print(f"Searched in: {TEXTURE_SEARCH_DIRS}")
     
     return texture_map
 
+def fbx_polygon_indices(triangles: List[int]) -> List[int]:
+    """
+    Convert a triangle index list to FBX PolygonVertexIndex values.
+    
+    FBX marks the last index of each polygon as -(index + 1). A trailing
+    incomplete triangle is dropped.
+    """
+    indices = np.array(triangles[:len(triangles) // 3 * 3], dtype=np.int64)
+    indices[2::3] = -(indices[2::3] + 1)
+    return indices.tolist()
+
 def create_fbx_ascii(model: Model, output_path: str) -> None:
     """
     Create an FBX ASCII file from the model.
@@ -152,8 +194,12 @@ def create_fbx_ascii(model: Model, output_path: str) -> None:
     # Copy textures and get texture mapping
     texture_map = copy_textures_for_export(model, export_dir)
     
-    # Open the output file
-    with open(output_path, 'w') as f:
+    # Names are written as they are (bytes show up as b'...'). Format each one
+    # once here instead of once per frame and link below.
+    animation_labels = [str(animation.name) for animation in model.animations]
+    
+    # Build the file in memory and write it out with one call at the end
+    with io.StringIO() as f:
         # Write FBX header
         f.write("; FBX 7.3.0 project file\n")
         f.write("; Created by Python 3db to FBX converter\n\n")
@@ -217,8 +263,14 @@ def create_fbx_ascii(model: Model, output_path: str) -> None:
                 f.write("        Cropping: 0, 0, 0, 0\n")
                 f.write("    }\n")
         
+        # (geometry id, model id, material index) of every link, collected while
+        # writing the objects so the connections don't walk the model again
+        connections = []
+        
         # Process each animation
         for anim_idx, animation in enumerate(model.animations):
+            anim_label = animation_labels[anim_idx]
+            
             # For each mesh in the animation
             for frame_idx, mesh_idx in enumerate(animation.meshes):
                 if mesh_idx >= len(model.meshes):
@@ -234,36 +286,32 @@ def create_fbx_ascii(model: Model, output_path: str) -> None:
                     points = model.points_data[link.points]
                     texture_coordinates = model.texture_coordinates_data[link.texture_coordinates]
                     
-                    # Transform points
-                    transformed_points = [transform_point(p) for p in points]
+                    # Transform points - same math as transform_point, applied to
+                    # the whole link at once
+                    transformed_points = ((np.asarray(points, dtype=np.float64).reshape(-1, 3) - 0.5) * 100.0).tolist()
                     
                     # Generate a unique ID for this geometry
                     geom_id = 3000 + anim_idx * 1000 + frame_idx * 100 + link_idx
                     
                     # Write geometry
-                    f.write(f"    Geometry: {geom_id}, \"Geometry::{animation.name}_frame{frame_idx}_link{link_idx}\", \"Mesh\" {{\n")
+                    f.write(f"    Geometry: {geom_id}, \"Geometry::{anim_label}_frame{frame_idx}_link{link_idx}\", \"Mesh\" {{\n")
                     f.write("        Properties70:  {\n")
                     f.write("            P: \"Color\", \"ColorRGB\", \"Color\", \"\", 0.8, 0.8, 0.8\n")
                     f.write("        }\n")
                     f.write("        Vertices: *{} {{\n".format(len(transformed_points) * 3))
                     f.write("            a: ")
-                    for i, p in enumerate(transformed_points):
-                        f.write("{},{},{},".format(p[0], p[1], p[2]))
+                    # Each block below is formatted in full and written with a single call
+                    f.write("".join(["{},{},{},".format(p[0], p[1], p[2]) for p in transformed_points]))
                     f.write("\n        }\n")
                     
                     # Write polygon vertex indices
                     f.write("        PolygonVertexIndex: *{} {{\n".format(len(triangles)))
                     f.write("            a: ")
-                    for i in range(0, len(triangles), 3):
-                        if i + 2 < len(triangles):
-                            # FBX uses negative indices to mark the end of a polygon
-                            f.write("{},{},{}".format(
-                                triangles[i], 
-                                triangles[i+1], 
-                                -(triangles[i+2] + 1)  # Negative to mark end of polygon
-                            ))
-                            if i + 3 < len(triangles):
-                                f.write(",")
+                    # FBX uses negative indices to mark the end of a polygon
+                    polygon_text = ",".join(map(str, fbx_polygon_indices(triangles)))
+                    if len(triangles) >= 3 and len(triangles) % 3:
+                        polygon_text += ","
+                    f.write(polygon_text)
                     f.write("\n        }\n")
                     
                     # Write UV coordinates
@@ -275,8 +323,7 @@ def create_fbx_ascii(model: Model, output_path: str) -> None:
                     f.write("            ReferenceInformationType: \"Direct\"\n")
                     f.write("            Normals: *{} {{\n".format(len(triangles) * 3))
                     f.write("                a: ")
-                    for i in range(len(triangles)):
-                        f.write("0,1,0,")  # Simplified: just use up vector for all normals
+                    f.write("0,1,0," * len(triangles))  # Simplified: just use up vector for all normals
                     f.write("\n            }\n")
                     f.write("        }\n")
                     
@@ -288,13 +335,11 @@ def create_fbx_ascii(model: Model, output_path: str) -> None:
                     f.write("            ReferenceInformationType: \"IndexToDirect\"\n")
                     f.write("            UV: *{} {{\n".format(len(texture_coordinates) * 2))
                     f.write("                a: ")
-                    for tc in texture_coordinates:
-                        f.write("{},{},".format(tc[0], tc[1]))
+                    f.write("".join(["{},{},".format(tc[0], tc[1]) for tc in texture_coordinates]))
                     f.write("\n            }\n")
                     f.write("            UVIndex: *{} {{\n".format(len(triangles)))
                     f.write("                a: ")
-                    for i in range(len(triangles)):
-                        f.write("{},".format(triangles[i]))
+                    f.write("".join(map("{},".format, triangles)))
                     f.write("\n            }\n")
                     f.write("        }\n")
                     
@@ -329,7 +374,8 @@ def create_fbx_ascii(model: Model, output_path: str) -> None:
                     
                     # Create a model (node) for this geometry
                     model_id = 4000 + anim_idx * 1000 + frame_idx * 100 + link_idx
-                    f.write(f"    Model: {model_id}, \"{animation.name}_frame{frame_idx}_link{link_idx}\", \"Mesh\" {{\n")
+                    connections.append((geom_id, model_id, link.material))
+                    f.write(f"    Model: {model_id}, \"{anim_label}_frame{frame_idx}_link{link_idx}\", \"Mesh\" {{\n")
                     f.write("        Version: 232\n")
                     f.write("        Properties70:  {\n")
                     f.write("            P: \"RotationActive\", \"bool\", \"\", \"\", 1\n")
@@ -340,24 +386,6 @@ def create_fbx_ascii(model: Model, output_path: str) -> None:
                     f.write("        Shading: T\n")
                     f.write("        Culling: \"CullingOff\"\n")
                     f.write("    }\n")
-                    
-                    # Create material connections
-                    f.write(f"    Material: {1000 + link.material}, \"{model.materials[link.material].name}\", \"\" {{\n")
-                    f.write("        Version: 102\n")
-                    f.write("        ShadingModel: \"phong\"\n")
-                    f.write("        MultiLayer: 0\n")
-                    f.write("        Properties70:  {\n")
-                    f.write("            P: \"DiffuseColor\", \"Color\", \"\", \"A\", 0.8, 0.8, 0.8\n")
-                    f.write("            P: \"SpecularColor\", \"Color\", \"\", \"A\", 0.2, 0.2, 0.2\n")
-                    f.write("            P: \"Emissive\", \"Vector3D\", \"Vector\", \"\", 0, 0, 0\n")
-                    f.write("            P: \"Ambient\", \"Vector3D\", \"Vector\", \"\", 0.2, 0.2, 0.2\n")
-                    f.write("            P: \"Diffuse\", \"Vector3D\", \"Vector\", \"\", 0.8, 0.8, 0.8\n")
-                    f.write("            P: \"Specular\", \"Vector3D\", \"Vector\", \"\", 0.2, 0.2, 0.2\n")
-                    f.write("            P: \"Shininess\", \"double\", \"Number\", \"\", 20\n")
-                    f.write("            P: \"Opacity\", \"double\", \"Number\", \"\", 1\n")
-                    f.write("            P: \"Reflectivity\", \"double\", \"Number\", \"\", 0\n")
-                    f.write("        }\n")
-                    f.write("    }\n")
         
         # Write connections section
         f.write("}\n\n")
@@ -369,24 +397,17 @@ def create_fbx_ascii(model: Model, output_path: str) -> None:
                 f.write(f"    C: \"OP\", {2000 + i}, {1000 + i}, \"DiffuseColor\"\n")
         
         # Connect geometries to models and materials
-        for anim_idx, animation in enumerate(model.animations):
-            for frame_idx, mesh_idx in enumerate(animation.meshes):
-                if mesh_idx >= len(model.meshes):
-                    continue
-                
-                mesh = model.meshes[mesh_idx]
-                
-                for link_idx, link in enumerate(mesh.links):
-                    geom_id = 3000 + anim_idx * 1000 + frame_idx * 100 + link_idx
-                    model_id = 4000 + anim_idx * 1000 + frame_idx * 100 + link_idx
-                    
-                    # Connect geometry to model
-                    f.write(f"    C: \"OO\", {geom_id}, {model_id}\n")
-                    
-                    # Connect material to model
-                    f.write(f"    C: \"OO\", {1000 + link.material}, {model_id}\n")
+        for geom_id, model_id, material_index in connections:
+            # Connect geometry to model
+            f.write(f"    C: \"OO\", {geom_id}, {model_id}\n")
+            
+            # Connect material to model
+            f.write(f"    C: \"OO\", {1000 + material_index}, {model_id}\n")
         
         f.write("}\n")
+        
+        with open(output_path, 'w') as out:
+            out.write(f.getvalue())
     
     print(f"FBX ASCII file written to {output_path}")
 
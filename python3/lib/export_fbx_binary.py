@@ -1,5 +1,8 @@
 import os
+import glob
 import shutil
+import functools
+import io
 import struct
 import numpy as np
 from typing import List, Dict, Tuple, Optional
@@ -9,9 +12,14 @@ import tempfile
 import json
 import time
 import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import re
 from lib.parse_3db import Model, Animation, Mesh, MeshLink
-from lib.export_fbx import extract_texture_filename, get_texture_path, copy_textures_for_export, transform_point
+from lib.export_fbx import (
+    extract_texture_filename, get_texture_path, copy_textures_for_export, copy_if_changed, transform_point,
+    _find_texture_file
+)
 from lib.export_config import (
     MATERIAL_SPECULAR, MATERIAL_ROUGHNESS, EMBED_TEXTURES, BLENDER_TIMEOUT,
     BLENDER_SCRIPT, MODEL_HIERARCHY, TEXTURE_SETTINGS
@@ -19,41 +27,149 @@ from lib.export_config import (
 
 from lib.export import clean_material_name
 
+# Textures for materials matched by keywords in their name. Candidates are
+# (directory under assets/textures, file name), highest resolution first.
+SPECIAL_TEXTURES = [
+    (("zbaby", "baby"), [
+        ('m256', 'Character_ZBaby_a.tga'),
+        ('m128', 'Character_ZBaby_a.tga'),
+        ('m064', 'Character_ZBaby_a.tga'),
+        ('Gray', 'Character_ZBaby_a.tga'),
+    ]),
+    # Hats and helmets
+    (("huete", "helme", "hat"), [
+        ('m256', 'helme_huete_a.tga'),
+        ('m128', 'helme_huete_a.tga'),
+        ('m064', 'helme_huete_a.tga'),
+        ('', 'helme_huete_a.tga'),
+    ]),
+    # Character_Hamster_a_128.tga doesn't exist in m256
+    (("hamster",), [
+        ('m256', 'Character_Hamster_gross.tga'),
+        ('m128', 'Character_Hamster_a_128.tga'),
+        ('m128', 'Character_Hamster_b_128.tga'),
+        ('m064', 'Character_Hamster_a_128.tga'),
+        ('Gray', 'Character_Hamster_a_128.tga'),
+        ('Gray', 'Character_Hamster_gross.tga'),
+    ]),
+]
+
+# Upper bound on threads copying texture files at the same time
+TEXTURE_COPY_WORKERS = 8
+
+# Bytes requested per read when draining Blender's output pipes
+PIPE_READ_SIZE = 65536
+
+# Written next to an FBX exported by Blender, recording what it was exported from
+EXPORT_STAMP_SUFFIX = '.export.json'
+
+# Modules in lib/ whose code determines the exported FBX
+EXPORTER_MODULES = ['parse_3db.py', 'export.py', 'export_config.py', 'export_fbx.py', 'export_fbx_binary.py']
+
+# Set to True to print the texture map details while exporting
+DEBUG = False
+
+# Environment variables read by the Blender script that don't depend on the model
+BLENDER_ENVIRONMENT = {
+    'ANIMATION_FPS': '6',
+    'ANIMATION_FRAME_DURATION': '2',
+    'EXPORT_TEXTURES': 'True',  # Force texture export
+    'DEBUG_MATERIALS': 'True'  # Enable materials debugging
+}
+
+# Part of the Blender export config that is the same for every model
+BLENDER_STATIC_CONFIG = {
+    "texture_dirs": TEXTURE_SETTINGS["SEARCH_SUBDIRS"],
+    "default_texture_ext": TEXTURE_SETTINGS["DEFAULT_EXTENSION"],
+    "material_settings": {
+        "specular": MATERIAL_SPECULAR,
+        "roughness": MATERIAL_ROUGHNESS,
+        "color_space": TEXTURE_SETTINGS["COLOR_SPACE"]
+    }
+}
+
+# config.json in the repository root
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.json')
+
+# Parsed config.json, reused until the file's modification time changes
+_config_cache = {"mtime": None, "data": None}
+
 # Function to load configuration
 def load_config():
-    config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.json')
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            return config
-        except Exception as e:
-            print(f"Error loading config file: {str(e)}")
-    return {}
+    # A single stat both checks that the file exists and tells whether the
+    # cached copy is still current
+    try:
+        mtime = os.stat(CONFIG_PATH).st_mtime
+    except OSError:
+        return {}
+    
+    if _config_cache["mtime"] == mtime:
+        return _config_cache["data"]
+    
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"Error loading config file: {str(e)}")
+        return {}
+    
+    _config_cache["mtime"] = mtime
+    _config_cache["data"] = config
+    return config
+
+# Standard Blender install locations, used when Blender isn't on PATH
+BLENDER_WINDOWS_GLOB = r'C:\Program Files\Blender Foundation\Blender*\blender.exe'
+BLENDER_MACOS_PATH = '/Applications/Blender.app/Contents/MacOS/Blender'
+
+def _blender_version_key(path):
+    """Sort key for a Windows install path: the version in its folder name, as numbers."""
+    version = re.search(r'(\d+(?:\.\d+)*)\s*$', os.path.basename(os.path.dirname(path)))
+    if not version:
+        # Unversioned "Blender" folder
+        return ()
+    return tuple(int(part) for part in version.group(1).split('.'))
+
+def find_blender(config):
+    """Return the path of the Blender executable to use, or None if there isn't one."""
+    # shutil.which accepts a full path as well as a bare command name, so one
+    # call both validates the configured path and searches PATH
+    configured_path = config.get('blender_path')
+    if configured_path:
+        print(f"Found Blender path in config: {configured_path}")
+        resolved_path = shutil.which(configured_path)
+        if resolved_path:
+            print(f"Verified Blender at config path: {resolved_path}")
+            return resolved_path
+    
+    resolved_path = shutil.which('blender')
+    if resolved_path:
+        print(f"Found Blender in PATH at: {resolved_path}")
+        return resolved_path
+    
+    # Installed versions, newest first, then the macOS application bundle
+    candidates = sorted(glob.glob(BLENDER_WINDOWS_GLOB), key=_blender_version_key, reverse=True)
+    if candidates:
+        print(f"Found Blender at: {candidates[0]}")
+        return candidates[0]
+    if os.path.isfile(BLENDER_MACOS_PATH):
+        print(f"Found Blender at: {BLENDER_MACOS_PATH}")
+        return BLENDER_MACOS_PATH
+    
+    return None
+
+# A backslash in front of an operator character, as left behind by escaping
+# the script text. Covers \!= and \== too, since only the backslash goes.
+_ESCAPED_OPERATOR_RE = re.compile(r'\\([!<>=+\-*/%])')
+
+def fix_script_escapes(content):
+    """Remove stray backslashes before operators that break the Blender script's syntax."""
+    # Fix common syntax errors with escape sequences in a single pass
+    return _ESCAPED_OPERATOR_RE.sub(r'\1', content)
 
 def validate_blender_script(script_path):
     """Validate and fix the Blender script to ensure it doesn't have syntax errors."""
     with open(script_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Fix common syntax errors with escape sequences
-    replacements = [
-        (r'\!=', '!='),
-        (r'\!', '!'),
-        (r'\<', '<'),
-        (r'\>', '>'),
-        (r'\==', '=='),
-        (r'\=', '='),
-        (r'\+', '+'),
-        (r'\-', '-'),
-        (r'\*', '*'),
-        (r'\/', '/'),
-        (r'\%', '%')
-    ]
-    
-    # Apply all replacements
-    for old, new in replacements:
-        content = content.replace(old, new)
+        content = fix_script_escapes(f.read())
     
     # Write the corrected content back
     with open(script_path, 'w', encoding='utf-8') as f:
@@ -62,7 +178,230 @@ def validate_blender_script(script_path):
     print(f"Validated and fixed Blender script: {script_path}")
     return True
 
-def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx') -> None:
+@functools.lru_cache(maxsize=None)
+def _load_blender_script(source_path, mtime, validate):
+    """
+    Read a Blender script, fixing its escapes if validate is set, and return
+    the bytes to run. Cached per (path, mtime), so batch exports read and fix
+    each script once.
+    """
+    if not validate:
+        with open(source_path, 'rb') as f:
+            return f.read()
+    
+    with open(source_path, 'r', encoding='utf-8') as f:
+        content = fix_script_escapes(f.read())
+    print(f"Validated and fixed Blender script: {source_path}")
+    
+    # Same line endings a text-mode write would produce
+    return content.replace('\n', os.linesep).encode('utf-8')
+
+def _find_special_texture(candidates):
+    """Return the path of the first of candidates found on disk, or None."""
+    # Candidates are in priority order, so take the first one on disk.
+    # Each directory is listed once and then looked up in memory.
+    for subdir, filename in candidates:
+        path = _find_texture_file(os.path.join('assets', 'textures', subdir), filename)
+        if path is not None:
+            return path
+    return None
+
+def _stage_special_texture(texture_path, fbm_dir, temp_texture_dir):
+    """
+    Copy a special texture into the model's .fbm directory and link or copy it
+    into the temporary directory Blender reads from. Returns False if the
+    .fbm copy failed, in which case the texture isn't used.
+    """
+    texture_name = os.path.basename(texture_path)
+    target_path = os.path.join(fbm_dir, texture_name)
+    try:
+        if copy_if_changed(texture_path, target_path):
+            print(f"Copying texture: {texture_path} -> {target_path}")
+    except Exception as e:
+        print(f"Warning: Error copying texture {texture_path}: {str(e)}")
+        return False
+    
+    # Copy to temp dir for Blender
+    target_path = os.path.join(temp_texture_dir, texture_name)
+    try:
+        _link_or_copy(texture_path, target_path)
+        print(f"Copied texture to temp dir: {texture_path} -> {target_path}")
+    except Exception as e:
+        print(f"Warning: Could not copy texture {texture_path} to temp dir: {str(e)}")
+    return True
+
+def _material_label(material_name):
+    """Material name as a plain string without b'...' quoting, as the Blender script expects."""
+    material_str = str(material_name)
+    if isinstance(material_name, bytes):
+        try:
+            material_str = material_name.decode('utf-8', errors='ignore')
+        except:
+            material_str = str(material_name)
+    
+    # Clean up material name
+    return material_str.replace("b'", "").replace("'", "")
+
+def _link_or_copy(source_path, target_path):
+    """
+    Hard-link source_path to target_path, copying instead when a link isn't
+    possible (another drive, no link support, or the target already exists).
+    Only used for the temporary copies Blender reads, never for export output.
+    """
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        try:
+            shutil.copy2(source_path, target_path)
+        except shutil.SameFileError:
+            # Already linked by an earlier call
+            pass
+
+def _file_size(path):
+    """Size of a file in bytes, or 0 if it doesn't exist, from a single stat."""
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+def _write_debug_log(debug_log_path, debug_log):
+    """Write the collected debug log to disk in one go."""
+    try:
+        with open(debug_log_path, 'w') as f:
+            f.write(debug_log.getvalue())
+    except Exception as e:
+        print(f"Warning: Could not write debug log {debug_log_path}: {str(e)}")
+
+def _read_pipe_chunks(pipe, chunks):
+    """Read a subprocess pipe to the end in large blocks, appending the raw bytes to chunks."""
+    fd = pipe.fileno()
+    for chunk in iter(lambda: os.read(fd, PIPE_READ_SIZE), b''):
+        chunks.append(chunk)
+    pipe.close()
+
+def _decode_output(chunks):
+    """Join the chunks read from a pipe and decode them once, with \n line endings."""
+    text = b''.join(chunks).decode('utf-8', errors='ignore')
+    return text.replace('\r\n', '\n').rstrip('\n')
+
+def _find_blender_script():
+    """
+    Pick the Blender script to run, in order of preference.
+    Returns (path, mtime, needs validation, message), or None if there is none.
+    """
+    # Use script from config or fall back to default scripts
+    base_dir = os.path.dirname(os.path.dirname(__file__))
+    custom_script_path = os.path.join(base_dir, BLENDER_SCRIPT)
+    modular_script_path = os.path.join(base_dir, 'new_blender_script.py')
+    fixed_script_path = os.path.join(base_dir, 'blender_script_fixed.py')
+    regular_script_path = os.path.join(base_dir, 'blender_script.py')
+    
+    # (source, needs validation, message) in order of preference
+    script_candidates = [
+        (custom_script_path, False, f"Using Blender script from config: {custom_script_path}"),
+        (modular_script_path, False, f"Using NEW MODULAR Blender script: {modular_script_path}"),
+        (fixed_script_path, False, f"Using fixed Blender script with main() function from: {fixed_script_path}"),
+        # The regular script, or its .fixed copy, gets validated and fixed
+        (regular_script_path + ".fixed", True, f"Using original Blender script from: {regular_script_path}"),
+        (regular_script_path, True, f"Using original Blender script from: {regular_script_path}"),
+    ]
+    
+    for source_path, validate, message in script_candidates:
+        # One stat both checks the script exists and keys the script cache
+        try:
+            mtime = os.stat(source_path).st_mtime
+        except OSError:
+            continue
+        return source_path, mtime, validate, message
+    return None
+
+def _file_stamp(path):
+    """[size, mtime_ns] of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _export_inputs(model_path, model_name, animation):
+    """
+    Everything a Blender export of model_name depends on besides the model
+    object itself: the export mode, the .3db file, config.json, the Blender
+    script, the exporter code and the mapping files and .fbm textures the
+    script reads. Lists rather than tuples so the result compares equal to
+    itself after a JSON round trip.
+    """
+    lib_dir = os.path.dirname(os.path.abspath(__file__))
+    # The Blender script always reads these relative to the working directory
+    fbx_dir = os.path.join('exports', 'fbx')
+    fbm_dir = os.path.join(fbx_dir, f'{model_name}.fbm')
+    
+    script = _find_blender_script()
+    blender_modules_dir = os.path.join(os.path.dirname(lib_dir), 'blender_modules')
+    try:
+        with os.scandir(blender_modules_dir) as entries:
+            script_files = sorted(entry.path for entry in entries if entry.name.endswith('.py'))
+    except OSError:
+        script_files = []
+    if script is not None:
+        script_files.insert(0, script[0])
+    
+    try:
+        with os.scandir(fbm_dir) as entries:
+            fbm_textures = sorted([entry.name, _file_stamp(entry.path)] for entry in entries if entry.is_file())
+    except OSError:
+        fbm_textures = []
+    
+    return {
+        'format': 'binary',
+        # None for a full export, otherwise the index of the only exported animation
+        'animation': animation,
+        'model': _file_stamp(model_path),
+        'config': _file_stamp(CONFIG_PATH),
+        'script': [[path, _file_stamp(path)] for path in script_files],
+        'exporter': [[name, _file_stamp(os.path.join(lib_dir, name))] for name in EXPORTER_MODULES],
+        'mappings': [[path, _file_stamp(path)] for path in (
+            'mappings.json',
+            os.path.join(fbx_dir, f'materials_{model_name}.json'),
+            os.path.join(fbx_dir, f'direct_materials_{model_name}.json'),
+        )],
+        'fbm': fbm_textures,
+    }
+
+def _output_is_current(output_path, inputs):
+    """
+    True if output_path was written by a successful Blender export with exactly
+    these inputs and hasn't been touched since. An ASCII fallback, a fixer pass
+    or any other rewrite changes the file's stamp, so it never matches.
+    """
+    output_stamp = _file_stamp(output_path)
+    if output_stamp is None:
+        return False
+    try:
+        with open(output_path + EXPORT_STAMP_SUFFIX, 'r') as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return stamp == {'inputs': inputs, 'output': output_stamp}
+
+def _write_export_stamp(output_path, inputs):
+    """Record the inputs of a successful Blender export next to its output."""
+    try:
+        with open(output_path + EXPORT_STAMP_SUFFIX, 'w') as f:
+            json.dump({'inputs': inputs, 'output': _file_stamp(output_path)}, f)
+    except OSError as e:
+        print(f"Warning: Could not write {output_path + EXPORT_STAMP_SUFFIX}: {e}")
+
+def _remove_export_stamp(output_path):
+    """Forget the last export's inputs before output_path gets rewritten."""
+    try:
+        os.remove(output_path + EXPORT_STAMP_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx',
+                         model_path: str = None, animation: int = None,
+                         force: bool = False) -> None:
     """
     Export the model to binary FBX format with proper hierarchy and materials.
     
@@ -77,69 +416,40 @@ def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx
     
     Each mesh part will have a properly assigned material with textures.
     No animations are included - just the static frame hierarchy.
+    
+    If model_path (the source .3db file) is given, a successful Blender export
+    records its inputs in a sidecar file next to the output, and a later export
+    with the same inputs (including animation, the exported animation index or
+    None) is skipped unless force is set.
     """
+    model_name = os.path.splitext(os.path.basename(output_path))[0]
+    if model_path is not None and not force:
+        if _output_is_current(output_path, _export_inputs(model_path, model_name, animation)):
+            print(f"FBX file is up to date, skipping export: {output_path}")
+            return
+    _remove_export_stamp(output_path)
+    
     # Create directories for export if they don't exist
     export_dir = os.path.dirname(output_path)
     os.makedirs(export_dir, exist_ok=True)
     
-    # Create a debug log file in the current directory
+    # Create a debug log file in the current directory. The log is collected
+    # in memory and written out once when the export finishes.
     debug_log_path = 'blender_debug.log'
-    with open(debug_log_path, 'w') as debug_log:
-        debug_log.write(f"=== BLENDER CONVERSION DEBUG LOG ===\n")
-        debug_log.write(f"Timestamp: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-        debug_log.write(f"Starting export_to_fbx_binary function\n")
-        debug_log.write(f"Model name: {model.name}\n")
-        debug_log.write(f"Output path: {output_path}\n")
-        # Note: temp_gltf_path will be initialized later in the code
+    debug_log = io.StringIO()
+    debug_log.write(f"=== BLENDER CONVERSION DEBUG LOG ===\n")
+    debug_log.write(f"Timestamp: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+    debug_log.write(f"Starting export_to_fbx_binary function\n")
+    debug_log.write(f"Model name: {model.name}\n")
+    debug_log.write(f"Output path: {output_path}\n")
+    # Note: temp_gltf_path will be initialized later in the code
     
     # Load configuration
     config = load_config()
     
     # Check if Blender is available before starting the export
-    blender_path = None
-    
-    # First check the path from the configuration file
-    if 'blender_path' in config and config['blender_path']:
-        config_blender_path = config['blender_path']
-        print(f"Found Blender path in config: {config_blender_path}")
-        if os.path.exists(config_blender_path):
-            print(f"Verified Blender at config path: {config_blender_path}")
-            blender_path = config_blender_path
-    
-    # If the path in configuration is not specified or invalid, look for Blender in standard locations
-    if not blender_path:
-        possible_blender_paths = [
-            r'C:\Program Files\Blender Foundation\Blender 4.3\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 3.6\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 3.5\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 3.4\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 3.3\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 3.2\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 3.1\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 3.0\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 2.9\blender.exe',
-            r'C:\Program Files\Blender Foundation\Blender 2.8\blender.exe',
-            '/Applications/Blender.app/Contents/MacOS/Blender',
-            'blender'  # Try system PATH
-        ]
-        
-        print("Searching for Blender installation...")
-        for path in possible_blender_paths:
-            try:
-                # Check if Blender exists at this path
-                if os.path.exists(path):
-                    print(f"Found Blender at: {path}")
-                    blender_path = path
-                    break
-                elif shutil.which(path):
-                    resolved_path = shutil.which(path)
-                    print(f"Found Blender in PATH at: {resolved_path}")
-                    blender_path = resolved_path
-                    break
-            except Exception as e:
-                print(f"Error checking path {path}: {str(e)}")
-                continue
+    print("Searching for Blender installation...")
+    blender_path = find_blender(config)
     
     # Обновляем таймаут из конфигурации, если указан
     if 'settings' in config and 'blender_timeout' in config['settings']:
@@ -157,17 +467,19 @@ def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx
         print("WARNING: Blender not found. Binary FBX export will not be available.")
         print("The converter will fall back to ASCII FBX export, which may not be compatible with all software.")
         print("Please install Blender for full functionality.")
-        print("Recommended Blender paths checked:")
-        for path in possible_blender_paths:
-            exists = "Found" if os.path.exists(path) else "Not found"
-            in_path = "Found in PATH" if shutil.which(path) else "Not in PATH"
-            print(f"  - {path}: {exists}, {in_path}")
+        print("Locations checked:")
+        if config.get('blender_path'):
+            print(f"  - {config['blender_path']} (config.json)")
+        print("  - blender on PATH")
+        print(f"  - {BLENDER_WINDOWS_GLOB}")
+        print(f"  - {BLENDER_MACOS_PATH}")
         print("="*80 + "\n")
         
         # Fall back to ASCII FBX export
         print("\nBlender not found. Falling back to ASCII FBX export...")
         print("NOTE: ASCII FBX files are not supported by many applications, including Blender itself.")
         print("Please install Blender for full compatibility.")
+        _write_debug_log(debug_log_path, debug_log)
         from lib.export_fbx import export_to_fbx
         export_to_fbx(model, output_path)
         return
@@ -176,44 +488,28 @@ def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx
     temp_dir = tempfile.mkdtemp()
     try:
         # Export to glTF first with the actual model name (not temp_model)
-        model_name = os.path.splitext(os.path.basename(output_path))[0]
         temp_gltf_path = os.path.join(temp_dir, f'{model_name}.gltf')
         
+        # Texture directories, created once: the FBM directory (used instead of
+        # a textures directory) next to the output, and a copy for Blender
+        fbm_dir = os.path.join(export_dir, f"{model_name}.fbm")
+        os.makedirs(fbm_dir, exist_ok=True)
+        temp_texture_dir = os.path.join(temp_dir, 'textures')
+        os.makedirs(temp_texture_dir, exist_ok=True)
+        
         # Update debug log with temp_gltf_path now that it's initialized
-        with open(debug_log_path, 'a') as debug_log:
-            debug_log.write(f"Temp GLTF path: {temp_gltf_path}\n")
-            debug_log.write(f"Blender executable: {blender_path}\n\n")
+        debug_log.write(f"Temp GLTF path: {temp_gltf_path}\n")
+        debug_log.write(f"Blender executable: {blender_path}\n\n")
         
         from lib.export import export_to_gltf
         export_to_gltf(model, temp_gltf_path)
         
-        # Completely remove the textures directory instead of just clearing it
+        # Textures from earlier exports stay in place; unchanged ones aren't
+        # copied again and ones this model no longer uses are removed below
         textures_dir = os.path.join(export_dir, 'textures')
-        if os.path.exists(textures_dir):
-            try:
-                shutil.rmtree(textures_dir)
-                print(f"Completely removed textures directory: {textures_dir}")
-            except Exception as e:
-                print(f"Error removing directory {textures_dir}: {e}")
-                # If rmtree fails, try to remove files individually
-                try:
-                    for file in os.listdir(textures_dir):
-                        file_path = os.path.join(textures_dir, file)
-                        if os.path.isfile(file_path):
-                            try:
-                                os.remove(file_path)
-                                print(f"Removed old texture: {file_path}")
-                            except Exception as e2:
-                                print(f"Error removing {file_path}: {e2}")
-                except Exception as e3:
-                    print(f"Error listing files in {textures_dir}: {e3}")
-                
-                # Finally try to remove the empty directory
-                try:
-                    os.rmdir(textures_dir)
-                    print(f"Removed empty directory: {textures_dir}")
-                except Exception as e4:
-                    print(f"Could not remove directory {textures_dir}: {e4}")
+        
+        # Decode and clean every material name once; the passes below only index into this
+        material_labels = [_material_label(material.name) for material in model.materials]
         
         # Copy textures to the export directory
         # First look for special case textures directly
@@ -221,217 +517,100 @@ def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx
         
         # Find special textures like Character_ZBaby_a.tga
         for i, material in enumerate(model.materials):
-            # Special handling for baby texture
-            texture_found = False
-            
-            # Convert material name to string if it's bytes
-            material_name_str = ""
-            if isinstance(material.name, bytes):
-                try:
-                    material_name_str = material.name.decode('utf-8', errors='ignore')
-                except Exception:
-                    material_name_str = str(material.name)
-            else:
-                material_name_str = str(material.name)
-                
-            material_name_lower = material_name_str.lower()
-            
-            if "zbaby" in material_name_lower or "baby" in material_name_lower:
-                # Priority order - high resolution first!
-                baby_paths = [
-                    # Highest resolution first
-                    os.path.join('assets', 'textures', 'm256', 'Character_ZBaby_a.tga'),
-                    
-                    # Medium resolution next
-                    os.path.join('assets', 'textures', 'm128', 'Character_ZBaby_a.tga'),
-                    
-                    # Lower resolutions last
-                    os.path.join('assets', 'textures', 'm064', 'Character_ZBaby_a.tga'),
-                    os.path.join('assets', 'textures', 'Gray', 'Character_ZBaby_a.tga')
-                ]
-                
-                # Try each baby path
-                for path in baby_paths:
-                    if os.path.exists(path):
-                        texture_name = os.path.basename(path)
-                        # Create FBM directory instead of textures directory
-                        fbm_dir = os.path.join(export_dir, f"{model_name}.fbm")
-                        os.makedirs(fbm_dir, exist_ok=True)
-                        target_path = os.path.join(fbm_dir, texture_name)
-                        
-                        print(f"Copying texture: {path} -> {target_path}")
-                        shutil.copy2(path, target_path)
-                        special_textures[material.name] = path
-                        texture_found = True
-                        break
+            material_name_lower = material_labels[i].lower()
             
-            # Check for hat/helmet texture
-            elif ("huete" in material_name_lower or "helme" in material_name_lower or 
-                  "hat" in material_name_lower):
-                # Priority order - high resolution first!
-                helmet_paths = [
-                    # Try highest resolution first
-                    os.path.join('assets', 'textures', 'm256', 'helme_huete_a.tga'),
-                    
-                    # Medium resolution next
-                    os.path.join('assets', 'textures', 'm128', 'helme_huete_a.tga'),
-                    
-                    # Lower resolution last
-                    os.path.join('assets', 'textures', 'm064', 'helme_huete_a.tga'),
-                    os.path.join('assets', 'textures', 'helme_huete_a.tga')
-                ]
-                
-                # Try each helmet path
-                for path in helmet_paths:
-                    if os.path.exists(path):
-                        texture_name = os.path.basename(path)
-                        # Create FBM directory instead of textures directory
-                        fbm_dir = os.path.join(export_dir, f"{model_name}.fbm")
-                        os.makedirs(fbm_dir, exist_ok=True)
-                        target_path = os.path.join(fbm_dir, texture_name)
-                        
-                        print(f"Copying texture: {path} -> {target_path}")
-                        shutil.copy2(path, target_path)
-                        special_textures[material.name] = path
-                        texture_found = True
-                        break
+            # The first special texture group whose keywords appear in the name
+            candidates = next((candidates for keywords, candidates in SPECIAL_TEXTURES
+                               if any(keyword in material_name_lower for keyword in keywords)), None)
+            if candidates is None:
+                continue
             
-            # Check for hamster texture
-            elif ("hamster" in material_name_lower):
-                print(f"DEBUG: Found hamster material: {material_name_lower}")
-                # Priority order - high resolution first!
-                hamster_paths = [
-                    # Try highest resolution first - note that Character_Hamster_a_128.tga doesn't exist in m256
-                    os.path.join('assets', 'textures', 'm256', 'Character_Hamster_gross.tga'),
-                    
-                    # Medium resolution next
-                    os.path.join('assets', 'textures', 'm128', 'Character_Hamster_a_128.tga'),
-                    os.path.join('assets', 'textures', 'm128', 'Character_Hamster_b_128.tga'),
-                    
-                    # Lower resolution last
-                    os.path.join('assets', 'textures', 'm064', 'Character_Hamster_a_128.tga'),
-                    os.path.join('assets', 'textures', 'Gray', 'Character_Hamster_a_128.tga'),
-                    os.path.join('assets', 'textures', 'Gray', 'Character_Hamster_gross.tga')
-                ]
-                
-                print(f"DEBUG: Checking hamster texture paths:")
-                # Try each hamster path and print its existence
-                for path in hamster_paths:
-                    path_exists = os.path.exists(path)
-                    print(f"  - {path}: {'EXISTS' if path_exists else 'NOT FOUND'}")
-                    
-                # Now try to use them
-                for path in hamster_paths:
-                    if os.path.exists(path):
-                        texture_name = os.path.basename(path)
-                        # Create FBM directory instead of textures directory
-                        fbm_dir = os.path.join(export_dir, f"{model_name}.fbm")
-                        os.makedirs(fbm_dir, exist_ok=True)
-                        target_path = os.path.join(fbm_dir, texture_name)
-                        
-                        print(f"DEBUG: Selected hamster texture: {path}")
-                        print(f"Copying texture: {path} -> {target_path}")
-                        try:
-                            shutil.copy2(path, target_path)
-                            special_textures[material.name] = path
-                            texture_found = True
-                            # Also copy to additional directories to ensure it can be found
-                            temp_texture_dir = os.path.join(temp_dir, 'textures')
-                            os.makedirs(temp_texture_dir, exist_ok=True)
-                            temp_target_path = os.path.join(temp_texture_dir, texture_name)
-                            shutil.copy2(path, temp_target_path)
-                            print(f"Also copied to: {temp_target_path}")
-                        except Exception as e:
-                            print(f"Warning: Error copying texture {path}: {str(e)}")
-                        break
+            texture_path = _find_special_texture(candidates)
+            if texture_path:
+                special_textures[material.name] = texture_path
         
-        # Also copy textures to the temporary directory to ensure they're available for Blender
-        temp_texture_dir = os.path.join(temp_dir, 'textures')
-        os.makedirs(temp_texture_dir, exist_ok=True)
-        
-        for material_name, texture_path in special_textures.items():
-            # Copy to temp dir for Blender
-            texture_name = os.path.basename(texture_path)
-            clean_name = clean_material_name(material_name)
-            target_filename = texture_name
-            target_path = os.path.join(temp_texture_dir, target_filename)
-            try:
-                shutil.copy2(texture_path, target_path)
-                print(f"Copied texture to temp dir: {texture_path} -> {target_path}")
-            except Exception as e:
-                print(f"Warning: Could not copy texture {texture_path} to temp dir: {str(e)}")
+        # Copy the textures to the FBM directory and the temporary directory
+        # Blender reads from. Materials often share a special texture, so each
+        # file is handled once, and the copies are I/O-bound so they run on threads.
+        texture_paths = list(dict.fromkeys(special_textures.values()))
+        if texture_paths:
+            with ThreadPoolExecutor(max_workers=min(TEXTURE_COPY_WORKERS, len(texture_paths))) as executor:
+                staged = dict(zip(texture_paths, executor.map(
+                    lambda texture_path: _stage_special_texture(texture_path, fbm_dir, temp_texture_dir),
+                    texture_paths)))
+            special_textures = {name: path for name, path in special_textures.items() if staged[path]}
         
         # Now use the regular texture copy function for any textures we didn't find
-        print(f"\nDEBUG: Searching for textures with copy_textures_for_export()")
+        if DEBUG:
+            print(f"\nDEBUG: Searching for textures with copy_textures_for_export()")
         texture_map = copy_textures_for_export(model, export_dir)
         
+        # Remove textures left by earlier exports that this model doesn't use
+        used_textures = {os.path.basename(texture_path) for texture_path in texture_map.values()}
+        # scandir entries carry their file type from the directory read, so
+        # there's no extra stat per file
+        try:
+            with os.scandir(textures_dir) as entries:
+                for entry in entries:
+                    if entry.name not in used_textures and entry.is_file():
+                        try:
+                            os.remove(entry.path)
+                            print(f"Removed old texture: {entry.path}")
+                        except Exception as e2:
+                            print(f"Error removing {entry.path}: {e2}")
+        except Exception as e3:
+            print(f"Error listing files in {textures_dir}: {e3}")
+        
         # Print the texture map to debug
-        print(f"\nDEBUG: Texture map from copy_textures_for_export():")
-        for mat_name, tex_path in texture_map.items():
-            print(f"  - {mat_name}: {tex_path}")
+        if DEBUG:
+            print(f"\nDEBUG: Texture map from copy_textures_for_export():")
+            for mat_name, tex_path in texture_map.items():
+                print(f"  - {mat_name}: {tex_path}")
+            print(f"\nDEBUG: Adding special textures to texture map:")
         
         # Add any special textures we found - IMPORTANT: these should override any conflicting textures
-        print(f"\nDEBUG: Adding special textures to texture map:")
         for material_name, texture_path in special_textures.items():
             texture_name = os.path.basename(texture_path)
             clean_name = clean_material_name(material_name)
             target_filename = texture_name
             texture_map[material_name] = os.path.join(f"{model_name}.fbm", target_filename)
-            print(f"  - Added special texture: {material_name} -> {texture_path}")
+            if DEBUG:
+                print(f"  - Added special texture: {material_name} -> {texture_path}")
         
         # Remove existing output file if it exists to ensure it's overwritten
-        if os.path.exists(output_path):
-            try:
-                os.remove(output_path)
-                print(f"Removed existing file: {output_path}")
-            except Exception as e:
-                print(f"Warning: Could not remove existing file {output_path}: {str(e)}")
+        try:
+            os.remove(output_path)
+            print(f"Removed existing file: {output_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Could not remove existing file {output_path}: {str(e)}")
         
         # Copy the external Blender script
         blender_script = os.path.join(temp_dir, 'convert_to_fbx.py')
         
-        # Use script from config or fall back to default scripts
-        custom_script_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), BLENDER_SCRIPT)
-        modular_script_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'new_blender_script.py')
-        fixed_script_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'blender_script_fixed.py')
-        regular_script_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'blender_script.py')
+        script_content = None
+        script = _find_blender_script()
+        if script is not None:
+            source_path, mtime, validate, message = script
+            script_content = _load_blender_script(source_path, mtime, validate)
+            print(message)
         
-        if os.path.exists(custom_script_path):
-            # Use the configured script
-            shutil.copy2(custom_script_path, blender_script)
-            print(f"Using Blender script from config: {custom_script_path}")
-        elif os.path.exists(modular_script_path):
-            # Use the new modular script
-            shutil.copy2(modular_script_path, blender_script)
-            print(f"Using NEW MODULAR Blender script: {modular_script_path}")
-        elif os.path.exists(fixed_script_path):
-            # Use the fixed script with main() function
-            shutil.copy2(fixed_script_path, blender_script)
-            print(f"Using fixed Blender script with main() function from: {fixed_script_path}")
-        elif os.path.exists(regular_script_path):
-            # Fall back to the regular script
-            if os.path.exists(regular_script_path + ".fixed"):
-                shutil.copy2(regular_script_path + ".fixed", blender_script)
-            else:
-                shutil.copy2(regular_script_path, blender_script)
-            # Validate and fix the copied script
-            validate_blender_script(blender_script)
-            print(f"Using original Blender script from: {regular_script_path}")
-        else:
+        if script_content is None:
             print(f"Warning: No Blender script found!")
             print("Falling back to ASCII FBX export...")
             from lib.export_fbx import export_to_fbx
             export_to_fbx(model, output_path)
             return
         
-        with open(blender_script, 'r') as f:
-            print(f"Blender script size: {len(f.read())} bytes")
+        with open(blender_script, 'wb') as f:
+            f.write(script_content)
+        print(f"Blender script size: {len(script_content)} bytes")
         
-        # Set essential environment variables
-        os.environ['ANIMATION_FPS'] = '6'
-        os.environ['ANIMATION_FRAME_DURATION'] = '2'
-        os.environ['EXPORT_TEXTURES'] = 'True'  # Force texture export
-        os.environ['DEBUG_MATERIALS'] = 'True'  # Enable materials debugging
+        # Set essential environment variables. The fixed ones only need setting
+        # once per process (and can be overridden from the environment).
+        for name, value in BLENDER_ENVIRONMENT.items():
+            os.environ.setdefault(name, value)
         os.environ['MODEL_NAME'] = model_name     # Pass the model name to use as root
         
         # Also create a simple JSON config to pass more settings to Blender
@@ -441,66 +620,44 @@ def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx
             # which textures to use for which materials
             material_texture_map = {}
             for material_name, texture_path in texture_map.items():
-                material_str = str(material_name)
-                if isinstance(material_name, bytes):
-                    try:
-                        material_str = material_name.decode('utf-8', errors='ignore')
-                    except:
-                        material_str = str(material_name)
-                
-                # Clean up material name
-                material_str = material_str.replace("b'", "").replace("'", "")
-                material_texture_map[material_str] = texture_path
+                material_texture_map[_material_label(material_name)] = texture_path
             
-            # Create a mapping from link positions to material names
+            # Create a mapping from link positions to material names. The inner
+            # dicts act as ordered sets, keeping names in first-seen order.
             link_position_map = {}
             
             # Analyze entire mesh structure
-            for mesh_idx, mesh in enumerate(model.meshes):
+            for mesh in model.meshes:
                 for link_idx, link in enumerate(mesh.links):
-                    if link.material < len(model.materials):
-                        material = model.materials[link.material]
-                        material_str = str(material.name)
-                        if isinstance(material.name, bytes):
-                            try:
-                                material_str = material.name.decode('utf-8', errors='ignore')
-                            except:
-                                material_str = str(material.name)
-                        
-                        material_str = material_str.replace("b'", "").replace("'", "")
-                        
-                        if link_idx not in link_position_map:
-                            link_position_map[link_idx] = []
-                        
-                        if material_str not in link_position_map[link_idx]:
-                            link_position_map[link_idx].append(material_str)
+                    if link.material < len(material_labels):
+                        link_materials = link_position_map.get(link_idx)
+                        if link_materials is None:
+                            link_materials = link_position_map[link_idx] = {}
+                        link_materials[material_labels[link.material]] = None
+            
+            # Lists for the debug log and the JSON config
+            link_position_map = {link_idx: list(materials) for link_idx, materials in link_position_map.items()}
             
             # Log the material-texture mappings
-            with open(debug_log_path, 'a') as debug_log:
-                debug_log.write("\n=== MATERIAL-TEXTURE MAPPINGS ===\n")
-                for mat, tex in material_texture_map.items():
-                    debug_log.write(f"{mat} -> {tex}\n")
-                
-                debug_log.write("\n=== LINK POSITION MAPPINGS ===\n")
-                for link_idx, materials in link_position_map.items():
-                    debug_log.write(f"Link position {link_idx}: {', '.join(materials[:5])}")
-                    if len(materials) > 5:
-                        debug_log.write(f" and {len(materials) - 5} more...")
-                    debug_log.write("\n")
+            debug_log.write("\n=== MATERIAL-TEXTURE MAPPINGS ===\n")
+            for mat, tex in material_texture_map.items():
+                debug_log.write(f"{mat} -> {tex}\n")
+            
+            debug_log.write("\n=== LINK POSITION MAPPINGS ===\n")
+            for link_idx, materials in link_position_map.items():
+                debug_log.write(f"Link position {link_idx}: {', '.join(materials[:5])}")
+                if len(materials) > 5:
+                    debug_log.write(f" and {len(materials) - 5} more...")
+                debug_log.write("\n")
             
             config = {
                 "model_name": model_name,
-                "texture_dirs": TEXTURE_SETTINGS["SEARCH_SUBDIRS"],
-                "default_texture_ext": TEXTURE_SETTINGS["DEFAULT_EXTENSION"],
+                **BLENDER_STATIC_CONFIG,
                 "material_texture_map": material_texture_map,
-                "link_position_map": link_position_map,
-                "material_settings": {
-                    "specular": MATERIAL_SPECULAR,
-                    "roughness": MATERIAL_ROUGHNESS,
-                    "color_space": TEXTURE_SETTINGS["COLOR_SPACE"]
-                }
+                "link_position_map": link_position_map
             }
-            json.dump(config, f, indent=2)
+            # Only Blender reads this file, so skip the indentation
+            json.dump(config, f)
         
         success = False  # Flag to track if binary FBX export was successful
         
@@ -521,84 +678,89 @@ def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx
             print(f"This may take a while for complex models (timeout: {blender_timeout}s)...")
             
             # Add a progress indicator
-            start_time = time.time()
+            start_time = time.monotonic()
             process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             
             # Wait for process to complete with a simple progress indicator and timeout
             try:
-                # Start reading output in a non-blocking way
-                stdout_data = []
-                stderr_data = []
+                # Drain both pipes on background threads so a chatty Blender
+                # can't fill a pipe and stall while we wait for it. Threads
+                # rather than select() because Windows can't select on pipes.
+                # The raw output is read in large blocks and decoded once at the end.
+                stdout_chunks = []
+                stderr_chunks = []
+                readers = [
+                    threading.Thread(target=_read_pipe_chunks, args=(process.stdout, stdout_chunks), daemon=True),
+                    threading.Thread(target=_read_pipe_chunks, args=(process.stderr, stderr_chunks), daemon=True)
+                ]
+                for reader in readers:
+                    reader.start()
                 
-                # Check for FBX file creation periodically
-                while process.poll() is None:
-                    elapsed = time.time() - start_time
-                    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                        print(f"FBX file created after {elapsed:.1f}s, waiting for Blender to complete...")
-                        # File exists, but we still wait for the process to complete
-                        
-                    # Print progress every 5 seconds
-                    if int(elapsed) % 5 == 0:
-                        print(f"Processing... (elapsed: {elapsed:.1f}s, timeout: {BLENDER_TIMEOUT}s)")
-                        
-                    # Read any available output
-                    while True:
-                        output = process.stdout.readline()
-                        if output:
-                            stdout_data.append(output.decode('utf-8', errors='ignore').strip())
-                        else:
-                            break
-                            
+                # Block on the process, waking every 5 seconds to print progress
+                while True:
+                    elapsed = time.monotonic() - start_time
+                    remaining = blender_timeout - elapsed
+                    
                     # Check for timeout
-                    if elapsed > blender_timeout:
+                    if remaining <= 0:
                         print(f"Timeout reached ({blender_timeout}s). Terminating Blender process...")
                         process.terminate()
                         # Give it a moment to terminate gracefully
-                        time.sleep(2)
-                        if process.poll() is None:
+                        try:
+                            process.wait(timeout=2)
+                        except subprocess.TimeoutExpired:
                             process.kill()
+                            process.wait()
                         break
-                        
-                    # Small sleep to avoid CPU thrashing
-                    time.sleep(0.5)
+                    
+                    try:
+                        process.wait(timeout=min(5, remaining))
+                        break
+                    except subprocess.TimeoutExpired:
+                        print(f"Processing... (elapsed: {time.monotonic() - start_time:.1f}s, timeout: {blender_timeout}s)")
                 
-                # Get any remaining output
-                stdout, stderr = process.communicate()
-                if stdout:
-                    stdout_data.append(stdout.decode('utf-8', errors='ignore').strip())
-                if stderr:
-                    stderr_data.append(stderr.decode('utf-8', errors='ignore').strip())
+                # The pipes close once Blender exits, which ends the readers
+                for reader in readers:
+                    reader.join(timeout=5)
+                stdout_text = _decode_output(stdout_chunks)
+                stderr_text = _decode_output(stderr_chunks)
                 
                 # Write output to log file for debugging
-                with open(debug_log_path, 'a') as debug_log:
-                    debug_log.write("\n=== BLENDER STDOUT ===\n")
-                    debug_log.write("\n".join(stdout_data))
-                    debug_log.write("\n\n=== BLENDER STDERR ===\n")
-                    debug_log.write("\n".join(stderr_data))
+                debug_log.write("\n=== BLENDER STDOUT ===\n")
+                debug_log.write(stdout_text)
+                debug_log.write("\n\n=== BLENDER STDERR ===\n")
+                debug_log.write(stderr_text)
                 
                 # Check if the process completed successfully
-                if process.returncode == 0 and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                    print(f"Blender completed successfully after {time.time() - start_time:.1f}s")
-                    print(f"FBX file created: {output_path} ({os.path.getsize(output_path) / 1024:.1f} KB)")
+                output_size = _file_size(output_path)
+                if process.returncode == 0 and output_size > 0:
+                    print(f"Blender completed successfully after {time.monotonic() - start_time:.1f}s")
+                    print(f"FBX file created: {output_path} ({output_size / 1024:.1f} KB)")
                     success = True
+                    if model_path is not None:
+                        # Taken after the export, which stages textures into the .fbm directory itself
+                        _write_export_stamp(output_path, _export_inputs(model_path, model_name, animation))
                 else:
-                    error_message = "\n".join(stderr_data)
+                    error_message = stderr_text
                     print(f"Blender process failed or timed out (returncode: {process.returncode})")
                     if error_message:
                         print(f"Error message: {error_message}")
                     print(f"See {debug_log_path} for details")
                     
                     # Check if output file exists but process failed
-                    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                    if output_size > 0:
                         print("Warning: Output file exists but Blender process failed. File may be incomplete.")
                         success = True  # Still treat as success if we have a file
                 
             except KeyboardInterrupt:
                 print("\nProcess interrupted by user. Terminating Blender...")
                 process.terminate()
-                time.sleep(2)
-                if process.poll() is None:
+                # Returns as soon as Blender exits instead of always sleeping
+                try:
+                    process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
                     process.kill()
+                    process.wait()
                 print("Process terminated.")
             
             # If the binary FBX export failed, fall back to ASCII FBX export
@@ -614,6 +776,8 @@ def export_to_fbx_binary(model: Model, output_path: str = 'exports/fbx/model.fbx
             export_to_fbx(model, output_path)
     
     finally:
+        _write_debug_log(debug_log_path, debug_log)
+        
         # Clean up temporary directory
         try:
             shutil.rmtree(temp_dir)
@@ -2,6 +2,13 @@ import struct
 from dataclasses import dataclass
 from typing import List, Dict, Tuple
 
+# Precompiled formats for the fixed-size reads below. .3db files are little-endian.
+_U8 = struct.Struct('<B')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_F32 = struct.Struct('<f')
+_VEC3 = struct.Struct('<3f')
+
 # FIXME: Surely theres a nice python library already for this
 class Deserializer:
     def __init__(self, data: bytes):
@@ -12,18 +19,18 @@ class Deserializer:
         self.offset += count
 
     def read_u8(self):
-        value = struct.unpack_from('B', self.data, self.offset)[0]
-        self.advance(struct.calcsize('B'))
+        value = _U8.unpack_from(self.data, self.offset)[0]
+        self.advance(_U8.size)
         return value
 
     def read_u16(self) -> int:
-        value = struct.unpack_from('H', self.data, self.offset)[0]
-        self.advance(struct.calcsize('H'))
+        value = _U16.unpack_from(self.data, self.offset)[0]
+        self.advance(_U16.size)
         return value
 
     def read_u32(self) -> int:
-        value = struct.unpack_from('I', self.data, self.offset)[0]
-        self.advance(struct.calcsize('I'))
+        value = _U32.unpack_from(self.data, self.offset)[0]
+        self.advance(_U32.size)
         return value
 
     def read_string(self) -> str:
@@ -33,15 +40,14 @@ class Deserializer:
         return string
 
     def read_f32(self) -> float:
-        value = struct.unpack_from('f', self.data, self.offset)[0]
-        self.advance(struct.calcsize('f'))
+        value = _F32.unpack_from(self.data, self.offset)[0]
+        self.advance(_F32.size)
         return value
 
     def read_vec3(self) -> (float, float, float):
-        x = self.read_f32()
-        y = self.read_f32()
-        z = self.read_f32()
-        return (x, y, z)
+        value = _VEC3.unpack_from(self.data, self.offset)
+        self.advance(_VEC3.size)
+        return value
 
 @dataclass
 class MeshLink:
@@ -6,12 +6,30 @@ Creates and manages material-to-texture mappings for Diggles models.
 """
 
 import os
+import functools
+import mmap
 import json
+import re
 import shutil
 import sys
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Any, Optional
 
+# Upper bound on threads copying texture files at the same time
+TEXTURE_COPY_WORKERS = 16
+
+# Set to True to hard-link textures into the .fbm directory instead of copying
+# them when assets and exports share a drive. Off by default: a linked texture
+# is the asset file itself, so editing the exported copy would change the asset.
+LINK_TEXTURES = False
+
+# Set to True to write the mapping JSON files indented for reading
+DEBUG = False
+
+# b'...' wrappers and stray quotes left in names by str() of bytes
+_NAME_QUOTES_RE = re.compile(r"b'|['\"]")
+
 def decode_bytes(value):
     """Safely decode bytes to string."""
     if isinstance(value, bytes):
@@ -25,55 +43,69 @@ def clean_name(name):
     """Clean material or texture name for use in filenames."""
     if isinstance(name, bytes):
         name = decode_bytes(name)
-    return name.replace("b'", "").replace("'", "").replace('"', '').strip()
+    return _NAME_QUOTES_RE.sub('', name).strip()
+
+def write_json(data, path: str) -> None:
+    """Write a mapping file, compact unless DEBUG is set; the Blender stage only parses it."""
+    with open(path, 'w', encoding='utf-8') as f:
+        if DEBUG:
+            json.dump(data, f, indent=2)
+        else:
+            json.dump(data, f, separators=(',', ':'))
+
+# Texture directories in order of resolution preference
+TEXTURE_DIRS = [
+    os.path.join("assets", "textures", "m256"),
+    os.path.join("assets", "textures", "m128"),
+    os.path.join("assets", "textures", "m064"),
+    os.path.join("assets", "textures", "Gray"),
+    os.path.join("assets", "textures", "ClassIcons"),
+    os.path.join("assets", "textures", "Misc"),
+    os.path.join("assets", "textures")
+]
+
+@functools.lru_cache(maxsize=None)
+def _texture_index():
+    """
+    Scan all texture directories once. Returns a map from file name to
+    (directory rank, path) for the most preferred directory holding it, and a
+    map from case-folded name without extension to the preferred path.
+    """
+    by_name = {}
+    by_base = {}
+    for rank, texture_dir in enumerate(TEXTURE_DIRS):
+        try:
+            # is_file() uses the type scandir already read, so no stat per file
+            with os.scandir(texture_dir) as it:
+                files = [entry.name for entry in it if entry.is_file()]
+        except OSError:
+            continue
+        for file in files:
+            path = os.path.join(texture_dir, file)
+            by_name.setdefault(file, (rank, path))
+            by_base.setdefault(os.path.splitext(file)[0].casefold(), path)
+    return by_name, by_base
 
 def find_highest_res_texture(texture_name: str) -> Optional[str]:
     """Find the highest resolution version of a texture."""
-    # Search directories in order of resolution preference
-    texture_dirs = [
-        os.path.join("assets", "textures", "m256"),
-        os.path.join("assets", "textures", "m128"),
-        os.path.join("assets", "textures", "m064"),
-        os.path.join("assets", "textures", "Gray"),
-        os.path.join("assets", "textures", "ClassIcons"),
-        os.path.join("assets", "textures", "Misc"),
-        os.path.join("assets", "textures")
-    ]
+    by_name, by_base = _texture_index()
     
-    # Try exact match with different extensions
-    for texture_dir in texture_dirs:
-        if not os.path.exists(texture_dir):
-            continue
-            
-        # Try exact filename match
-        texture_path = os.path.join(texture_dir, texture_name)
-        if os.path.exists(texture_path):
-            return texture_path
-            
-        # Try with different extensions
-        for ext in ['.tga', '.png', '.jpg', '.jpeg']:
-            base_name = os.path.splitext(texture_name)[0]
-            texture_path = os.path.join(texture_dir, base_name + ext)
-            if os.path.exists(texture_path):
-                return texture_path
-    
-    # If exact match fails, try case-insensitive match
-    texture_name_lower = texture_name.lower()
-    for texture_dir in texture_dirs:
-        if not os.path.exists(texture_dir):
-            continue
-            
-        for file in os.listdir(texture_dir):
-            if file.lower() == texture_name_lower:
-                return os.path.join(texture_dir, file)
-                
-            # Try with different extensions
-            base_name = os.path.splitext(texture_name)[0].lower()
-            file_base = os.path.splitext(file)[0].lower()
-            if file_base == base_name:
-                return os.path.join(texture_dir, file)
+    base_name = os.path.splitext(texture_name)[0]
+    candidate_names = [texture_name] + [base_name + ext for ext in ['.tga', '.png', '.jpg', '.jpeg']]
+    
+    # Try exact match with different extensions. The most preferred directory
+    # wins, and within a directory the earliest candidate name.
+    best = None
+    for name in candidate_names:
+        found = by_name.get(name)
+        if found and (best is None or found[0] < best[0]):
+            best = found
+    if best:
+        return best[1]
     
-    return None
+    # If exact match fails, try case-insensitive match on the name without
+    # extension (casefold rather than lower, so non-ASCII names match too)
+    return by_base.get(base_name.casefold())
 
 def create_material_mapping(model, output_dir: str, model_name: str) -> Dict:
     """Create a mapping from material names to texture paths."""
@@ -84,9 +116,12 @@ def create_material_mapping(model, output_dir: str, model_name: str) -> Dict:
         "link_materials": {}
     }
     
+    # Clean every material name once; the link pass below only indexes into this
+    material_keys = [clean_name(material.name) for material in model.materials]
+    
     # First, extract material names and their textures from the model
     for i, material in enumerate(model.materials):
-        mat_name = clean_name(material.name)
+        mat_name = material_keys[i]
         
         # Get texture name from material path
         if isinstance(material.path, bytes):
@@ -105,34 +140,36 @@ def create_material_mapping(model, output_dir: str, model_name: str) -> Dict:
             "links": []
         }
     
-    # Analyze link mappings
-    for mesh_idx, mesh in enumerate(model.meshes):
+    # Analyze link mappings. Insertion-ordered dicts are used as sets while
+    # collecting, so the duplicate checks don't scan lists, and are turned
+    # into lists afterwards.
+    material_links = {mat_name: {} for mat_name in mapping["materials"]}
+    link_materials = {}
+    for mesh in model.meshes:
         for link_idx, link in enumerate(mesh.links):
             material_idx = link.material
-            if material_idx < len(model.materials):
-                material = model.materials[material_idx]
-                mat_name = clean_name(material.name)
+            if material_idx < len(material_keys):
+                mat_name = material_keys[material_idx]
                 
                 # Add link position to material
-                if link_idx not in mapping["materials"][mat_name]["links"]:
-                    mapping["materials"][mat_name]["links"].append(link_idx)
+                material_links[mat_name][link_idx] = None
                 
                 # Create link mapping
-                link_key = f"link{link_idx}"
-                if link_key not in mapping["link_materials"]:
-                    mapping["link_materials"][link_key] = []
-                
-                if mat_name not in mapping["link_materials"][link_key]:
-                    mapping["link_materials"][link_key].append(mat_name)
+                link_materials.setdefault(f"link{link_idx}", {})[mat_name] = None
+    
+    for mat_name, links in material_links.items():
+        mapping["materials"][mat_name]["links"] = list(links)
+    mapping["link_materials"] = {link_key: list(mat_names) for link_key, mat_names in link_materials.items()}
     
     # Special case handling for known models
     if "odin" in model_name.lower():
-        # Check if Fifi03 material exists and ensure it has a texture
+        # Check if Fifi03 material exists and ensure it has a texture.
+        # The texture is looked up once for all Fifi materials.
         fifi_found = False
+        fifi_texture = find_highest_res_texture("Fifi03.tga")
         for mat_name in mapping["materials"]:
             if "fifi" in mat_name.lower():
                 fifi_found = True
-                fifi_texture = find_highest_res_texture("Fifi03.tga")
                 if fifi_texture:
                     mapping["materials"][mat_name]["texture_path"] = fifi_texture
                     mapping["materials"][mat_name]["texture_name"] = "Fifi03.tga"
@@ -149,14 +186,54 @@ def create_material_mapping(model, output_dir: str, model_name: str) -> Dict:
     
     # Write the mapping to a JSON file
     mapping_file = os.path.join(output_dir, f"materials_{model_name}.json")
-    with open(mapping_file, 'w') as f:
-        json.dump(mapping, f, indent=2)
+    write_json(mapping, mapping_file)
     
     print(f"Created material mapping file: {mapping_file}")
     return mapping
 
-def copy_mapped_textures(mapping: Dict, model_name: str) -> List[str]:
-    """Copy all mapped textures to the model's fbm directory and create a direct mapping."""
+def _copy_texture(source_path: str, target_path: str) -> Optional[Exception]:
+    """Copy one texture, returning the exception instead of raising so it can be reported later."""
+    try:
+        if LINK_TEXTURES:
+            try:
+                os.link(source_path, target_path)
+                return None
+            except OSError:
+                # Another drive, no link support, or the target exists; copy instead
+                pass
+        shutil.copy2(source_path, target_path)
+        return None
+    except Exception as e:
+        return e
+
+def _clear_texture_dir(textures_dir: str) -> None:
+    """Remove a texture directory, or just the files in it if it can't be removed."""
+    # Most of these directories don't exist, so just try the removal
+    try:
+        shutil.rmtree(textures_dir)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"Error removing textures directory {textures_dir}: {e}")
+        # If we can't remove the directory, clear its contents
+        try:
+            with os.scandir(textures_dir) as it:
+                files = [entry for entry in it if entry.is_file()]
+        except OSError:
+            files = []
+        for entry in files:
+            try:
+                os.remove(entry.path)
+            except Exception as e:
+                print(f"Error removing texture {entry.name}: {e}")
+        return
+    print(f"Removed old textures directory: {textures_dir}")
+
+def copy_mapped_textures(mapping: Dict, model_name: str, dest_dir: Optional[str] = None) -> List[str]:
+    """
+    Copy all mapped textures to the model's fbm directory (or dest_dir) and
+    create a direct mapping. Nothing else is written besides the mapping file.
+    """
     print(f"\n===== Creating direct texture mapping for model: {model_name} =====")
     
     # IMPORTANT - First, remove ALL texture directories to avoid wrong texture assignments
@@ -169,50 +246,51 @@ def copy_mapped_textures(mapping: Dict, model_name: str) -> List[str]:
     ]
     
     for textures_dir in texture_dirs_to_clear:
-        if os.path.exists(textures_dir):
-            print(f"Removing old textures directory: {textures_dir}")
-            try:
-                shutil.rmtree(textures_dir)
-            except Exception as e:
-                print(f"Error removing textures directory: {e}")
-                # If we can't remove the directory, clear its contents
-                if os.path.exists(textures_dir):
-                    for file in os.listdir(textures_dir):
-                        file_path = os.path.join(textures_dir, file)
-                        if os.path.isfile(file_path):
-                            try:
-                                os.remove(file_path)
-                            except Exception as e:
-                                print(f"Error removing texture {file}: {e}")
+        _clear_texture_dir(textures_dir)
     
     # Create only the .fbm directory - this is the standard format for FBX textures
-    fbm_dir = os.path.join("exports", "fbx", f"{model_name}.fbm")
+    fbm_dir = dest_dir or os.path.join("exports", "fbx", f"{model_name}.fbm")
     os.makedirs(fbm_dir, exist_ok=True)
+    # Resolved once; every mapped texture is a plain file name inside it
+    fbm_abs_dir = os.path.abspath(fbm_dir)
     
     # Create a direct material to texture path mapping
     direct_mapping = {}
     
-    # Copy mapped textures to fbm directory
-    copied_textures = []
+    # Collect the mapped textures to copy to the fbm directory. Materials often
+    # share a texture, so each target file is copied once (the last source wins,
+    # as it did when every material copied its own).
+    texture_jobs = []
+    target_sources = {}
     for mat_name, mat_info in mapping["materials"].items():
         if mat_info["texture_path"] and os.path.exists(mat_info["texture_path"]):
-            # Clean material name for consistent keys
-            material_clean = mat_name.replace("b'", "").replace("'", "").strip()
+            # Keys were already cleaned by clean_name in create_material_mapping
+            material_clean = mat_name
             
             # Copy to .fbm directory
             fbm_target_path = os.path.join(fbm_dir, mat_info["texture_name"])
+            texture_jobs.append((material_clean, fbm_target_path, mat_info))
+            target_sources[fbm_target_path] = mat_info["texture_path"]
+    
+    # The copies are independent and I/O-bound, so they run on threads
+    copy_errors = {}
+    if target_sources:
+        with ThreadPoolExecutor(max_workers=min(TEXTURE_COPY_WORKERS, len(target_sources))) as executor:
+            copy_errors = dict(zip(target_sources, executor.map(
+                lambda item: _copy_texture(item[1], item[0]), target_sources.items())))
+    
+    # Report in material order once all copies are done
+    copied_textures = []
+    for material_clean, fbm_target_path, mat_info in texture_jobs:
+        error = copy_errors[fbm_target_path]
+        if error is None:
+            # Add to direct mapping - use absolute paths for Blender
+            direct_mapping[material_clean] = os.path.join(fbm_abs_dir, mat_info["texture_name"])
             
-            try:
-                # Copy texture to fbm directory
-                shutil.copy2(mat_info["texture_path"], fbm_target_path)
-                
-                # Add to direct mapping - use absolute paths for Blender
-                direct_mapping[material_clean] = os.path.abspath(fbm_target_path)
-                
-                copied_textures.append(mat_info["texture_name"])
-                print(f"Mapped material '{material_clean}' -> '{fbm_target_path}'")
-            except Exception as e:
-                print(f"Error copying texture {mat_info['texture_path']}: {e}")
+            copied_textures.append(mat_info["texture_name"])
+            print(f"Mapped material '{material_clean}' -> '{fbm_target_path}'")
+        else:
+            print(f"Error copying texture {mat_info['texture_path']}: {error}")
     
     # Create a more efficient mapping that supports materials with suffixes
     # Instead of generating all possible suffixes (which would be too many),
@@ -220,9 +298,7 @@ def copy_mapped_textures(mapping: Dict, model_name: str) -> List[str]:
     base_material_mapping = {}
     
     # Create a mapping of base material names (without suffixes) to texture paths
-    for mat_name in list(mapping["materials"].keys()):
-        material_clean = mat_name.replace("b'", "").replace("'", "").strip()
-        
+    for material_clean in mapping["materials"]:
         # Store mapping from material name to texture path
         if material_clean in direct_mapping:
             base_material_mapping[material_clean] = direct_mapping[material_clean]
@@ -234,13 +310,12 @@ def copy_mapped_textures(mapping: Dict, model_name: str) -> List[str]:
     # Save the mappings to a temporary JSON file that will be used during conversion
     # but will be removed afterward
     direct_mapping_path = os.path.join("exports", "fbx", f"direct_materials_{model_name}.json")
-    with open(direct_mapping_path, 'w') as f:
-        json.dump({
-            "model_name": model_name,
-            "direct_mappings": direct_mapping,
-            "base_material_mappings": base_material_mapping,
-            "textures_dir": os.path.abspath(fbm_dir)  # Point directly to FBM dir
-        }, f, indent=2)
+    write_json({
+        "model_name": model_name,
+        "direct_mappings": direct_mapping,
+        "base_material_mappings": base_material_mapping,
+        "textures_dir": fbm_abs_dir  # Point directly to FBM dir
+    }, direct_mapping_path)
     
     print(f"Created direct material->texture mapping at: {direct_mapping_path}")
     print(f"IMPORTANT: Using explicit texture mapping for precise material-texture assignment!")
@@ -285,8 +360,9 @@ def main():
     
     # Parse the model
     print(f"Loading model from {args.model_path}")
-    with open(args.model_path, 'rb') as f:
-        file_data = f.read()
+    # Map the file instead of reading it into memory; the parser only
+    # unpacks values out of the buffer, so nothing refers to it afterwards
+    with open(args.model_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_data:
         model = parse_3db_file(file_data)
     
     # Create material mapping
@@ -1,10 +1,125 @@
 import os
+import mmap
+import pickle
 import sys
 import argparse
 from lib.parse_3db import parse_3db_file, Model
 from lib.export import export_to_gltf
 from lib.export_fbx_binary import export_to_fbx_binary
 import lib.export_config as export_config
+import lib.parse_3db as parse_3db
+
+# Parsed models from earlier runs, one pickle per model name
+PARSE_CACHE_DIR = os.path.join('exports', '.parse_cache')
+
+def load_model(model_path: str, model_name: str) -> Model:
+    """
+    Parse a .3db file, reusing the result of an earlier run while neither the
+    file nor the parser has changed since.
+    """
+    model_stat = os.stat(model_path)
+    cache_key = (model_stat.st_size, model_stat.st_mtime_ns, os.stat(parse_3db.__file__).st_mtime_ns)
+    cache_path = os.path.join(PARSE_CACHE_DIR, f'{model_name}.pkl')
+    
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_key, model = pickle.load(f)
+        if cached_key == cache_key:
+            return model
+    except Exception:
+        # No usable cache, parse the file
+        pass
+    
+    # Map the file instead of reading it into memory; the parser only
+    # unpacks values out of the buffer, so nothing refers to it afterwards
+    with open(model_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_data:
+        model = parse_3db_file(file_data)
+    
+    # Write to a temporary name first so an interrupted run can't leave a broken cache
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        temp_path = cache_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump((cache_key, model), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: Could not write parse cache {cache_path}: {e}")
+    return model
+
+def convert_model(model_path: str, animation: int = None, list_animations: bool = False,
+                  ascii_only: bool = False, glb: bool = False, quantize: bool = False,
+                  compress: bool = False, force: bool = False) -> bool:
+    """
+    Convert one .3db model to glTF and FBX in the exports directory. The
+    arguments match run.py's command-line options. Returns False on errors.
+    """
+    # Ensure the model file exists
+    if not os.path.exists(model_path):
+        print(f"Error: Model file not found at {model_path}")
+        return False
+    
+    # Get the model name without extension for use in output paths
+    model_name = os.path.splitext(os.path.basename(model_path))[0]
+    
+    # Define output paths
+    gltf_extension = 'glb' if glb else 'gltf'
+    gltf_output_path = os.path.join('exports', 'gltf', f'{model_name}.{gltf_extension}')
+    fbx_output_path = os.path.join('exports', 'fbx', f'{model_name}.fbx')
+    
+    # Create output directories if they don't exist
+    os.makedirs(os.path.dirname(gltf_output_path), exist_ok=True)
+    os.makedirs(os.path.dirname(fbx_output_path), exist_ok=True)
+    
+    print(f'Loading model from {model_path}')
+    model = load_model(model_path, model_name)
+    
+    # Print summary of the model
+    print(f"\nModel Summary:")
+    print(f"  Name: {model.name}")
+    print(f"  Materials: {len(model.materials)}")
+    print(f"  Meshes: {len(model.meshes)}")
+    print(f"  Animations: {len(model.animations)}")
+    for i, anim in enumerate(model.animations):
+        print(f"    Animation {i}: {anim.name} - {len(anim.meshes)} frames")
+    
+    # If --list-animations is specified, don't export
+    if list_animations:
+        return True
+    
+    # If a specific animation is requested, create a new model with only that animation
+    if animation is not None:
+        if animation < 0 or animation >= len(model.animations):
+            print(f"Error: Animation index {animation} is out of range (0-{len(model.animations)-1})")
+            return False
+        
+        print(f"Exporting only animation {animation}: {model.animations[animation].name}")
+        
+        # Create a modified model with only the specified animation
+        selected_animation = model.animations[animation]
+        
+        # Make a shallow copy of the model and replace the animations list
+        # with a list containing only the selected animation
+        model.animations = [selected_animation]
+        
+        # Use the modified model for export
+        export_model = model
+    else:
+        export_model = model
+    
+    # Export to both formats
+    export_to_gltf(export_model, gltf_output_path, quantize_positions=quantize,
+                   compress_buffers=compress)
+    
+    if ascii_only:
+        print("Forcing ASCII FBX export as requested")
+        from lib.export_fbx import export_to_fbx
+        export_to_fbx(export_model, fbx_output_path)
+    else:
+        # Skipped if the last Blender export had the same model, animation and inputs
+        export_to_fbx_binary(export_model, fbx_output_path, model_path=model_path,
+                             animation=animation, force=force)
+    
+    return True
 
 def main():
     # Set up command-line argument parser
@@ -14,6 +129,10 @@ def main():
     parser.add_argument('--animation', type=int, help='Export only the specified animation index')
     parser.add_argument('--timeout', type=int, default=export_config.BLENDER_TIMEOUT, help=f'Maximum time in seconds to wait for Blender processing (default: {export_config.BLENDER_TIMEOUT})')
     parser.add_argument('--ascii-only', action='store_true', help='Force ASCII FBX export without trying Blender')
+    parser.add_argument('--glb', action='store_true', help='Write the glTF export as a single binary .glb file')
+    parser.add_argument('--quantize', action='store_true', help='Store glTF positions as 16-bit values (KHR_mesh_quantization)')
+    parser.add_argument('--force', action='store_true', help='Re-export the binary FBX even if nothing it depends on has changed')
+    parser.add_argument('--compress', action='store_true', help='Also write a compressed copy of the glTF buffer (Blosc if installed, gzip otherwise)')
     
     args = parser.parse_args()
     
@@ -44,69 +163,9 @@ def main():
             print("Error: Could not find baby.3db in any of the expected locations.")
             return
     
-    # Ensure the model file exists
-    if not os.path.exists(model_path):
-        print(f"Error: Model file not found at {model_path}")
-        return
-    
-    # Get the model name without extension for use in output paths
-    model_name = os.path.splitext(os.path.basename(model_path))[0]
-    
-    # Define output paths
-    gltf_output_path = os.path.join('exports', 'gltf', f'{model_name}.gltf')
-    fbx_output_path = os.path.join('exports', 'fbx', f'{model_name}.fbx')
-    
-    # Create output directories if they don't exist
-    os.makedirs(os.path.dirname(gltf_output_path), exist_ok=True)
-    os.makedirs(os.path.dirname(fbx_output_path), exist_ok=True)
-    
-    print(f'Loading model from {model_path}')
-    with open(model_path, 'rb') as f:
-        file_data = f.read()
-        model = parse_3db_file(file_data)
-        
-        # Print summary of the model
-        print(f"\nModel Summary:")
-        print(f"  Name: {model.name}")
-        print(f"  Materials: {len(model.materials)}")
-        print(f"  Meshes: {len(model.meshes)}")
-        print(f"  Animations: {len(model.animations)}")
-        for i, anim in enumerate(model.animations):
-            print(f"    Animation {i}: {anim.name} - {len(anim.meshes)} frames")
-        
-        # If --list-animations is specified, don't export
-        if args.list_animations:
-            return
-        
-        # If a specific animation is requested, create a new model with only that animation
-        if args.animation is not None:
-            if args.animation < 0 or args.animation >= len(model.animations):
-                print(f"Error: Animation index {args.animation} is out of range (0-{len(model.animations)-1})")
-                return
-            
-            print(f"Exporting only animation {args.animation}: {model.animations[args.animation].name}")
-            
-            # Create a modified model with only the specified animation
-            selected_animation = model.animations[args.animation]
-            
-            # Make a shallow copy of the model and replace the animations list
-            # with a list containing only the selected animation
-            model.animations = [selected_animation]
-            
-            # Use the modified model for export
-            export_model = model
-        else:
-            export_model = model
-        
-        # Export to both formats
-        export_to_gltf(export_model, gltf_output_path)
-        
-        if args.ascii_only:
-            print("Forcing ASCII FBX export as requested")
-            from lib.export_fbx import export_to_fbx
-            export_to_fbx(export_model, fbx_output_path)
-        else:
-            export_to_fbx_binary(export_model, fbx_output_path)
+    convert_model(model_path, animation=args.animation, list_animations=args.list_animations,
+                  ascii_only=args.ascii_only, glb=args.glb, quantize=args.quantize,
+                  compress=args.compress, force=args.force)
 
 if __name__ == "__main__":
     main()
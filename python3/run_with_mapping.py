@@ -9,11 +9,18 @@ This script creates a material mapping file and ensures correct textures are use
 import os
 import sys
 import argparse
-import subprocess
 import importlib.util
 import shutil
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 
+# Upper bound on directories removed at the same time
+DIRECTORY_REMOVAL_WORKERS = 8
+
+# Print per-file details (texture listings, each removed directory); set by -v
+VERBOSE = False
+
 def print_header(title, char="="):
     """Print a header with decoration."""
     width = 80
@@ -21,20 +28,31 @@ def print_header(title, char="="):
     print(f"{title:^{width}}")
     print(f"{char * width}\n")
 
-def create_material_mapping(model_path):
-    """Create a material mapping file for the model."""
-    # Import material_mapper module
+@functools.lru_cache(maxsize=None)
+def load_script_module(module_name):
+    """Load one of the scripts in python3/ as a module, executing it only once per process."""
+    # The scripts import the lib package from python3/
+    if "python3" not in sys.path:
+        sys.path.append("python3")
+    
     spec = importlib.util.spec_from_file_location(
-        "material_mapper", 
-        os.path.join("python3", "material_mapper.py")
+        module_name,
+        os.path.join("python3", f"{module_name}.py")
     )
-    
     if not spec:
-        print("Error: Material mapper module not found")
-        return False
+        return None
     
-    mapper = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mapper)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def create_material_mapping(model_path):
+    """Create a material mapping file for the model. Returns the mapping, or None on failure."""
+    # Import material_mapper module
+    mapper = load_script_module("material_mapper")
+    if not mapper:
+        print("Error: Material mapper module not found")
+        return None
     
     # Get model name from path
     model_name = os.path.splitext(os.path.basename(model_path))[0]
@@ -43,120 +61,131 @@ def create_material_mapping(model_path):
     output_dir = os.path.join("exports", "fbx")
     os.makedirs(output_dir, exist_ok=True)
     
-    # Parse the model
+    # Parse the model through run.py's loader, which caches the parsed model
+    # on disk so the conversion afterwards doesn't parse it again
     print(f"Loading model for mapping: {model_path}")
-    with open(model_path, 'rb') as f:
-        file_data = f.read()
-        # Import the parse_3db function
-        sys.path.append("python3")
-        from lib.parse_3db import parse_3db_file
-        model = parse_3db_file(file_data)
+    runner = load_script_module("run")
+    if not runner:
+        print("Error: Conversion script module not found")
+        return None
+    model = runner.load_model(model_path, model_name)
     
     # Create material mapping
-    mapping = mapper.create_material_mapping(model, output_dir, model_name)
-    return mapping is not None
+    return mapper.create_material_mapping(model, output_dir, model_name)
 
 def run_conversion(model_path):
-    """Run the model conversion script to create FBX file."""
-    run_script = os.path.join("python3", "run.py")
-    
-    if not os.path.exists(run_script):
-        print(f"Error: Conversion script not found: {run_script}")
+    """Run the model conversion to create the FBX file."""
+    # Call run.py in this process instead of starting a new interpreter that
+    # would import numpy and the exporters again
+    runner = load_script_module("run")
+    if not runner:
+        print("Error: Conversion script module not found")
         return False
     
     print(f"Converting model: {model_path}")
-    cmd = [sys.executable, run_script, model_path]
     
     try:
-        subprocess.run(cmd, check=True)
+        if not runner.convert_model(model_path):
+            print("Conversion failed")
+            return False
         print("Conversion completed successfully")
         return True
-    except subprocess.CalledProcessError as e:
-        print(f"Conversion failed with error code {e.returncode}")
+    except Exception as e:
+        print(f"Conversion failed with error: {e}")
         return False
 
-def copy_textures_to_fbm(model_path):
-    """Copy textures based on the material mapping to the FBM directory."""
+def copy_textures_to_fbm(model_path, mapping=None):
+    """
+    Copy textures based on the material mapping to the FBM directory.
+    The mapping is read from its JSON file unless it's passed in.
+    """
     # Import material_mapper module
-    spec = importlib.util.spec_from_file_location(
-        "material_mapper", 
-        os.path.join("python3", "material_mapper.py")
-    )
-    
-    if not spec:
+    mapper = load_script_module("material_mapper")
+    if not mapper:
         print("Error: Material mapper module not found")
         return False
     
-    mapper = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mapper)
-    
     # Get model name from path
     model_name = os.path.splitext(os.path.basename(model_path))[0]
     
     # Load the mapping file
-    mapping_file = os.path.join("exports", "fbx", f"materials_{model_name}.json")
-    if not os.path.exists(mapping_file):
-        print(f"Error: Mapping file not found: {mapping_file}")
-        return False
-    
-    import json
-    with open(mapping_file, 'r') as f:
-        mapping = json.load(f)
+    if mapping is None:
+        mapping_file = os.path.join("exports", "fbx", f"materials_{model_name}.json")
+        if not os.path.exists(mapping_file):
+            print(f"Error: Mapping file not found: {mapping_file}")
+            return False
+        
+        import json
+        with open(mapping_file, 'r') as f:
+            mapping = json.load(f)
     
-    # Copy textures
-    copied_textures = mapper.copy_mapped_textures(mapping, model_name)
+    # Copy textures straight into the FBM directory, the only place they're needed
+    fbm_dir = os.path.join("exports", "fbx", f"{model_name}.fbm")
+    copied_textures = mapper.copy_mapped_textures(mapping, model_name, dest_dir=fbm_dir)
     return len(copied_textures) > 0
 
-def check_fbm_directory(model_name):
-    """Check the FBM directory to see what textures are present."""
+def check_fbm_directory(model_name, verbose=True):
+    """
+    Check the FBM directory to see what textures are present. If verbose, print
+    the count, plus every texture name when running with -v.
+    """
     fbm_dir = os.path.join("exports", "fbx", f"{model_name}.fbm")
-    if not os.path.exists(fbm_dir):
+    try:
+        with os.scandir(fbm_dir) as it:
+            textures = [entry.name for entry in it]
+    except FileNotFoundError:
         print(f"FBM directory not found: {fbm_dir}")
         return []
     
-    textures = os.listdir(fbm_dir)
-    print(f"Found {len(textures)} textures in FBM directory:")
-    for texture in textures:
-        print(f"  - {texture}")
+    if verbose:
+        # One write for the whole listing instead of one per texture
+        lines = [f"Found {len(textures)} textures in FBM directory" + (":" if VERBOSE and textures else "")]
+        if VERBOSE:
+            lines.extend(f"  - {texture}" for texture in textures)
+        print("\n".join(lines))
     
     return textures
 
+def _force_writable(func, path, _exc):
+    """rmtree error handler: make the path writable and retry (read-only files on Windows)."""
+    os.chmod(path, 0o777)
+    func(path)
+
 def safely_remove_directory(dir_path):
-    """Safely remove a directory by first removing all files inside it."""
-    if not os.path.exists(dir_path):
-        return True
+    """Safely remove a directory, clearing read-only flags that would stop the removal."""
+    # The error handler argument was renamed in Python 3.12
+    if sys.version_info >= (3, 12):
+        handler = {"onexc": _force_writable}
+    else:
+        handler = {"onerror": _force_writable}
     
     try:
-        # First remove all files in the directory
-        for root, dirs, files in os.walk(dir_path, topdown=False):
-            for file in files:
-                file_path = os.path.join(root, file)
-                try:
-                    os.chmod(file_path, 0o777)  # Try to change file permissions
-                    os.remove(file_path)
-                except Exception as e:
-                    print(f"Could not remove file {file_path}: {e}")
-            
-            # Remove empty subdirectories
-            for directory in dirs:
-                dir_to_remove = os.path.join(root, directory)
-                try:
-                    os.rmdir(dir_to_remove)
-                except Exception as e:
-                    print(f"Could not remove subdirectory {dir_to_remove}: {e}")
-        
-        # Now try to remove the directory itself
-        try:
-            os.rmdir(dir_path)
-            print(f"Safely removed directory: {dir_path}")
-            return True
-        except Exception as e:
-            print(f"Could not remove directory {dir_path}: {e}")
-            return False
-    
+        shutil.rmtree(dir_path, **handler)
+    except FileNotFoundError:
+        return True
     except Exception as e:
-        print(f"Error while cleaning directory {dir_path}: {e}")
+        print(f"Could not remove directory {dir_path}: {e}")
         return False
+    
+    if VERBOSE:
+        print(f"Safely removed directory: {dir_path}")
+    return True
+
+def remove_directories(dir_paths, message=None):
+    """
+    Remove every existing directory in dir_paths. The removals are independent
+    and I/O-bound, so they run on threads. message, if given, is printed
+    before each directory that gets removed.
+    """
+    existing = [dir_path for dir_path in dict.fromkeys(dir_paths) if os.path.isdir(dir_path)]
+    if not existing:
+        return
+    
+    if message:
+        print("\n".join(f"{message}: {dir_path}" for dir_path in existing))
+    
+    with ThreadPoolExecutor(max_workers=min(DIRECTORY_REMOVAL_WORKERS, len(existing))) as executor:
+        list(executor.map(safely_remove_directory, existing))
 
 def main():
     """Main entry point."""
@@ -177,9 +206,13 @@ Examples:
     parser.add_argument('--mapping-only', action='store_true', help='Only create mapping, do not convert')
     parser.add_argument('--textures-only', action='store_true', help='Only copy textures, do not convert')
     parser.add_argument('--no-fix-materials', action='store_true', help='Skip automatic fixing of duplicate materials (enabled by default)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='List every texture and removed directory')
     
     args = parser.parse_args()
     
+    global VERBOSE
+    VERBOSE = args.verbose
+    
     # Check if the model file exists
     if not os.path.exists(args.model_path):
         # Try with assets/models/ prefix
@@ -199,14 +232,12 @@ Examples:
         os.path.join("exports", "gltf", "textures"),
         os.path.join("textures")
     ]
-    for dir_path in texture_dirs:
-        if os.path.exists(dir_path):
-            print(f"Removing texture directory: {dir_path}")
-            safely_remove_directory(dir_path)
+    remove_directories(texture_dirs, "Removing texture directory")
     
     # Create material mapping
     print_header(f"Creating Material Mapping for {model_name}")
-    mapping_success = create_material_mapping(args.model_path)
+    mapping = create_material_mapping(args.model_path)
+    mapping_success = mapping is not None
     
     if not mapping_success:
         print("Error: Failed to create material mapping")
@@ -218,7 +249,7 @@ Examples:
     
     # Copy textures to FBM directory BEFORE conversion
     print_header(f"Copying Textures for {model_name}")
-    textures_success = copy_textures_to_fbm(args.model_path)
+    textures_success = copy_textures_to_fbm(args.model_path, mapping)
     
     if not textures_success:
         print("Error: Failed to copy textures")
@@ -230,12 +261,6 @@ Examples:
         print("Error: No textures found in FBM directory")
         return
     
-    # Make sure no textures directory exists before conversion
-    for dir_path in texture_dirs:
-        if os.path.exists(dir_path):
-            print(f"Removing texture directory again: {dir_path}")
-            safely_remove_directory(dir_path)
-    
     # Run conversion AFTER textures are copied
     if not args.textures_only:
         print_header(f"Converting {model_name}")
@@ -247,8 +272,8 @@ Examples:
     else:
         print("Skipping conversion as requested.")
     
-    # Check FBM directory
-    fbm_textures = check_fbm_directory(model_name)
+    # Check FBM directory (already listed above, so just count it for the summary)
+    fbm_textures = check_fbm_directory(model_name, verbose=False)
     
     # Apply material fixing automatically for all conversions
     # (skip only if explicitly requested with --mapping-only, --textures-only, or --no-fix-materials)
@@ -260,24 +285,11 @@ Examples:
         
         if os.path.exists(fbx_path):
             # Import the material fixer module
-            spec = importlib.util.spec_from_file_location(
-                "fix_duplicate_materials", 
-                os.path.join("python3", "fix_duplicate_materials.py")
-            )
+            fixer = load_script_module("fix_duplicate_materials")
             
-            if spec:
-                fixer = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(fixer)
-                
-                # Create the Blender script
-                script_path = fixer.create_blender_fixer_script()
-                
-                # Run Blender with the script
-                fix_success = fixer.run_blender_with_script(fbx_path, script_path)
-                
-                # Clean up
-                if os.path.exists(script_path):
-                    os.remove(script_path)
+            if fixer:
+                # Run Blender with the fixer script (passed inline, no temp file)
+                fix_success = fixer.run_blender_with_script(fbx_path)
                 
                 if fix_success:
                     print("Material fixing completed successfully")
@@ -297,7 +309,9 @@ Examples:
         os.path.join("exports", "fbx", f"materials_{model_name}.json")
     ]
     
-    # Directories to clean up - DO NOT delete gltf!
+    # Directories to clean up - DO NOT delete gltf! The mapping step only writes
+    # to the .fbm directory, but the FBX export stages textures for Blender in
+    # exports/fbx/textures, so that still has to go after conversion.
     dirs_to_cleanup = [
         os.path.join("exports", "fbx", f"{model_name}_textures"),
         os.path.join("exports", "fbx", "textures"),  # Texture folder in fbx
@@ -306,46 +320,60 @@ Examples:
     
     # Additionally find all directories with 'textures' in the name in the fbx directory
     # DO NOT touch the gltf directory!
-    for root, dirs, files in os.walk(os.path.join("exports", "fbx")):
-        for dirname in dirs:
-            if "textures" in dirname.lower() and os.path.join(root, dirname) not in dirs_to_cleanup:
-                # Exclude only .fbm directories that need to be preserved
-                if not dirname.endswith(".fbm"):
-                    dirs_to_cleanup.append(os.path.join(root, dirname))
+    # Only directories are scanned; ones marked for removal aren't descended into
+    pending = [os.path.join("exports", "fbx")]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as it:
+                subdirs = [entry for entry in it if entry.is_dir()]
+        except OSError:
+            continue
+        for entry in subdirs:
+            # Exclude only .fbm directories that need to be preserved
+            if "textures" in entry.name.lower() and not entry.name.endswith(".fbm"):
+                if entry.path not in dirs_to_cleanup:
+                    dirs_to_cleanup.append(entry.path)
+            elif not entry.is_symlink():
+                pending.append(entry.path)
     
     # Remove temporary files
     for file_path in files_to_cleanup:
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"Removed temporary file: {file_path}")
-            except Exception as e:
-                print(f"Error removing file {file_path}: {e}")
+        try:
+            os.remove(file_path)
+            print(f"Removed temporary file: {file_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error removing file {file_path}: {e}")
     
     # Remove temporary directories
-    for dir_path in dirs_to_cleanup:
-        if os.path.exists(dir_path):
-            safely_remove_directory(dir_path)
+    remove_directories(dirs_to_cleanup)
     
     # Final status
     print_header("SUMMARY", "#")
     fbx_path = os.path.join("exports", "fbx", f"{model_name}.fbx")
     fbm_dir = os.path.join("exports", "fbx", f"{model_name}.fbm")
     
+    # One stat answers both whether the FBX exists and how big it is
+    try:
+        fbx_size = os.stat(fbx_path).st_size
+    except OSError:
+        fbx_size = None
+    
     print(f"Model: {model_name}")
     print(f"Mapping: {'Success' if mapping_success else 'Failed'}")
     if not args.textures_only:
-        print(f"Conversion: {'Success' if os.path.exists(fbx_path) else 'Failed'}")
+        print(f"Conversion: {'Success' if fbx_size is not None else 'Failed'}")
     print(f"Textures: {'Success' if len(fbm_textures) > 0 else 'Failed'}")
     if not args.textures_only and not args.mapping_only and not args.no_fix_materials:
         print(f"Material Fixing: {'Applied' if 'fix_success' in locals() and fix_success else 'Failed'}")
     
-    if os.path.exists(fbx_path):
-        print(f"FBX File: {fbx_path} ({os.path.getsize(fbx_path) / 1024:.1f} KB)")
+    if fbx_size is not None:
+        print(f"FBX File: {fbx_path} ({fbx_size / 1024:.1f} KB)")
     else:
         print("FBX File: Not found")
     
-    if os.path.exists(fbm_dir):
+    if os.path.isdir(fbm_dir):
         print(f"Textures: {len(fbm_textures)} files in {fbm_dir}")
     else:
         print("Textures: No .fbm directory found")